@@ -0,0 +1,67 @@
+"""Minimal keep-alive HTTP/1.1 upstream used by the benchmarks.
+
+Answers every request with a fixed JSON body so the benchmarks measure the
+composite's client-side overhead rather than a real microservice.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Optional, Tuple
+
+DEFAULT_BODY = json.dumps({"id": 1, "title": "Stub Movie", "year": 2000}).encode()
+
+
+class StubUpstream:
+    def __init__(self, body: bytes = DEFAULT_BODY, delay: float = 0.0):
+        self.body = body
+        self.delay = delay
+        self.connections = 0
+        self.requests = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        assert self._server is not None
+        return self._server.sockets[0].getsockname()[:2]
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.address
+        return f"http://{host}:{port}"
+
+    async def start(self) -> "StubUpstream":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                self.requests += 1
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"content-type: application/json\r\n"
+                    + f"content-length: {len(self.body)}\r\n\r\n".encode()
+                    + self.body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
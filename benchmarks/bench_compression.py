@@ -0,0 +1,65 @@
+"""CPU time versus bytes saved for compressing composite responses.
+
+Usage:
+    python benchmarks/bench_compression.py [--iterations 500]
+
+For each payload in bench_json, reports the compressed size and the time to
+compress with gzip and brotli at several levels, alongside the cost of a
+pre-compressed cache hit (digest + lookup) as used by CompressionMiddleware.
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_json import PAYLOADS, _stdlib  # noqa: E402
+from services.cache import TTLCache  # noqa: E402
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CODECS = {
+    "gzip-1": lambda body: gzip.compress(body, compresslevel=1, mtime=0),
+    "gzip-6": lambda body: gzip.compress(body, compresslevel=6, mtime=0),
+    "gzip-9": lambda body: gzip.compress(body, compresslevel=9, mtime=0),
+}
+if brotli is not None:
+    CODECS["br-1"] = lambda body: brotli.compress(body, quality=1)
+    CODECS["br-4"] = lambda body: brotli.compress(body, quality=4)
+    CODECS["br-11"] = lambda body: brotli.compress(body, quality=11)
+
+
+def main(iterations: int) -> None:
+    cache = TTLCache("bench", max_entries=64, default_ttl=300)
+    print(f"{'route':<28}{'bytes':>8}{'codec':>8}{'size':>8}{'ratio':>8}{'compress':>12}{'cache hit':>12}")
+    for route, payload in PAYLOADS.items():
+        body = _stdlib(payload)
+        for name, codec in CODECS.items():
+            compressed = codec(body)
+            key = (name, hashlib.blake2b(body, digest_size=16).digest())
+            cache.set(key, compressed, size=len(compressed))
+            seconds = timeit.timeit(lambda: codec(body), number=iterations)
+            hit = timeit.timeit(
+                lambda: cache.get((name, hashlib.blake2b(body, digest_size=16).digest())), number=iterations
+            )
+            print(
+                f"{route:<28}{len(body):>8}{name:>8}{len(compressed):>8}{len(compressed) / len(body):>8.2f}"
+                f"{seconds / iterations * 1e6:>10.1f}us{hit / iterations * 1e6:>10.1f}us"
+            )
+    if brotli is None:
+        print("\nbrotli is not installed; install it to compare brotli levels.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+    main(args.iterations)
@@ -0,0 +1,122 @@
+"""Encode time per route for the composite's JSON responses.
+
+Usage:
+    python benchmarks/bench_json.py [--iterations 2000]
+
+Compares FastAPI's default path (jsonable_encoder + stdlib json), returning a
+plain JSONResponse directly (stdlib json only), and FastJSONResponse with
+orjson, on payloads shaped like real MS2/MS3 responses.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _movie(movie_id: int) -> dict:
+    return {
+        "id": movie_id,
+        "title": f"Movie {movie_id}: The Return of the Composite",
+        "original_title": f"Movie {movie_id}",
+        "year": 1990 + movie_id % 30,
+        "runtime_minutes": 95 + movie_id % 60,
+        "genres": ["Drama", "Thriller", "Mystery"],
+        "overview": "A long overview of the plot. " * 12,
+        "rating": 7.4,
+        "votes": 123456,
+        "poster_url": f"https://example.com/posters/{movie_id}.jpg",
+    }
+
+
+def _people(count: int) -> list:
+    return [
+        {
+            "person_id": i,
+            "name": f"Person Number {i}",
+            "role": "actor" if i % 5 else "director",
+            "character": f"Character {i}",
+            "billing_order": i,
+        }
+        for i in range(count)
+    ]
+
+
+def _reviews(count: int) -> dict:
+    return {
+        "total": 1234,
+        "page": 1,
+        "page_size": count,
+        "items": [
+            {
+                "id": i,
+                "movie_id": 42,
+                "user_id": 1000 + i,
+                "rating": i % 5 + 1,
+                "title": f"Review title {i}",
+                "body": "Thoughtful review text with some detail about the film. " * 6,
+                "created_at": "2024-05-01T12:34:56Z",
+            }
+            for i in range(count)
+        ],
+    }
+
+
+PAYLOADS = {
+    "GET /movies/{id}": _movie(42),
+    "GET /movies/{id}/people": _people(40),
+    "GET /reviews?page_size=100": _reviews(100),
+    "GET /movie-details/{id}": {
+        "movie": _movie(42),
+        "cast_and_crew": _people(40),
+        "reviews": _reviews(10),
+        "_links": {
+            "self": "/composite/movie-details/42",
+            "movie": "/composite/movies/42",
+            "reviews": "/composite/reviews?movie_id=42",
+        },
+    },
+}
+
+
+def _stdlib(content) -> bytes:
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+ENCODERS = {
+    "fastapi-default": lambda content: _stdlib(jsonable_encoder(content)),
+    "stdlib-direct": _stdlib,
+}
+if orjson is not None:
+    ENCODERS["orjson-direct"] = lambda content: orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def main(iterations: int) -> None:
+    print(f"{'route':<28}{'bytes':>8}" + "".join(f"{name:>18}" for name in ENCODERS))
+    for route, payload in PAYLOADS.items():
+        size = len(_stdlib(payload))
+        cells = []
+        for encode in ENCODERS.values():
+            seconds = timeit.timeit(lambda: encode(payload), number=iterations)
+            cells.append(f"{seconds / iterations * 1e6:>15.1f}us")
+        print(f"{route:<28}{size:>8}" + "".join(f"{cell:>18}" for cell in cells))
+    if orjson is None:
+        print("\norjson is not installed; install it to compare the fast path.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.iterations)
@@ -0,0 +1,85 @@
+"""Compare per-call httpx clients against a pooled DownstreamClient.
+
+Usage:
+    python benchmarks/bench_pooling.py [--requests 2000] [--concurrency 50]
+
+Both paths hit a local stub upstream, so the numbers isolate connection
+setup cost (TCP handshake, client construction) from upstream work. Against
+Cloud Run the gap is larger because every new connection also pays TLS.
+
+The pooled client is built without response cache, coalescing, retries,
+breaker or concurrency limit (unlike ``ms2.client``), so every call really
+goes upstream and only connection reuse is measured.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from benchmarks._stub import StubUpstream  # noqa: E402
+from services.downstream import DownstreamClient  # noqa: E402
+
+
+async def _per_call(base_url: str) -> None:
+    # The request path as it was before pooling: a fresh client per call
+    async with httpx.AsyncClient(base_url=base_url, timeout=5.0, follow_redirects=True) as client:
+        resp = await client.get("/movies/1")
+    resp.raise_for_status()
+
+
+async def _run(name, call, total: int, concurrency: int, stub: StubUpstream):
+    stub.connections = 0
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            start = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(
+        f"{name:<10} {total / elapsed:>9.0f} req/s  "
+        f"p50={statistics.median(latencies) * 1000:6.2f}ms  "
+        f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:6.2f}ms  "
+        f"connections={stub.connections}"
+    )
+
+
+async def main(total: int, concurrency: int) -> None:
+    stub = await StubUpstream().start()
+    pooled = DownstreamClient("bench", stub.base_url, coalesce=False)
+
+    try:
+        await _run("per-call", lambda: _per_call(stub.base_url), total, concurrency, stub)
+        await pooled.startup()
+        await _run(
+            "pooled",
+            lambda: pooled.request("GET", "/movies/{movie_id}", path_params={"movie_id": 1}),
+            total,
+            concurrency,
+            stub,
+        )
+    finally:
+        await pooled.shutdown()
+        await stub.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
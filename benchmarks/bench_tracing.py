@@ -0,0 +1,86 @@
+"""Per-request overhead of TracingMiddleware and timing spans.
+
+Usage:
+    python benchmarks/bench_tracing.py [--iterations 20000]
+
+Drives a trivial ASGI app directly (no network) with and without
+TracingMiddleware, with Server-Timing disabled and enabled, and times the
+``span``/``record`` helpers used on hot paths in both modes.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import tracing  # noqa: E402
+
+SCOPE = {
+    "type": "http",
+    "method": "GET",
+    "path": "/composite/movie-details/42",
+    "headers": [
+        (b"host", b"localhost"),
+        (b"accept", b"application/json"),
+        (b"traceparent", b"00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"),
+    ],
+}
+
+
+async def _app(scope, receive, send):
+    with tracing.span("decode"):
+        pass
+    tracing.record("ms2", "GET /movies/{movie_id}", 0.01)
+    tracing.outgoing_headers()
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    pass
+
+
+async def _drive(app, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await app(SCOPE, _receive, _send)
+    return (time.perf_counter() - start) / iterations
+
+
+def main(iterations: int) -> None:
+    apps = {
+        "no middleware": _app,
+        "tracing, timing off": tracing.TracingMiddleware(_app, server_timing_enabled=False),
+        "tracing, timing on": tracing.TracingMiddleware(_app, server_timing_enabled=True),
+    }
+    baseline = None
+    print(f"{'configuration':<24}{'per request':>14}{'overhead':>12}")
+    for name, app in apps.items():
+        seconds = asyncio.run(_drive(app, iterations))
+        baseline = seconds if baseline is None else baseline
+        print(f"{name:<24}{seconds * 1e6:>12.2f}us{(seconds - baseline) * 1e6:>10.2f}us")
+
+    print()
+    for enabled in (False, True):
+        token = tracing._timings.set([] if enabled else None)
+        span = timeit.timeit(lambda: tracing.span("decode").__enter__().__exit__(None, None, None), number=iterations)
+        record = timeit.timeit(lambda: tracing.record("ms2", "GET /movies/{movie_id}", 0.01), number=iterations)
+        tracing._timings.reset(token)
+        state = "on" if enabled else "off"
+        print(f"span() timing {state:<4}{span / iterations * 1e9:>10.0f}ns   record() {record / iterations * 1e9:>6.0f}ns")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    main(args.iterations)
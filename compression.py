@@ -0,0 +1,176 @@
+"""
+Response compression middleware.
+
+Negotiates brotli (when the ``brotli`` package is installed) or gzip from
+``Accept-Encoding`` for complete responses of at least ``minimum_size`` bytes.
+Streaming responses (no Content-Length, or a body sent in several messages,
+e.g. list pass-through, NDJSON) are left untouched so they keep constant memory. Compressed bodies are cached by
+content digest, so hot cached responses are compressed once rather than on
+every hit.
+"""
+import gzip
+import hashlib
+import os
+from typing import Optional
+
+from services.cache import TTLCache
+
+try:  # Optional dependency; gzip is always available
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in {"1", "true", "yes"}
+MINIMUM_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Media types that are already compressed or must be flushed incrementally
+_SKIPPED_TYPES = ("image/", "video/", "audio/", "text/event-stream", "application/x-ndjson", "application/zip")
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """Map each coding in an Accept-Encoding header to its q-value."""
+    codings = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[name.strip().lower()] = q
+    return codings
+
+
+def choose_encoding(header: str) -> Optional[str]:
+    codings = parse_accept_encoding(header)
+    if brotli is not None and codings.get("br", 0) > 0:
+        return "br"
+    if codings.get("gzip", codings.get("*", 0)) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str, *, gzip_level: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        *,
+        minimum_size: int = MINIMUM_SIZE,
+        cache_max_entries: int = int(os.getenv("COMPRESSION_CACHE_MAX_ENTRIES", "1024")),
+        cache_max_bytes: int = int(os.getenv("COMPRESSION_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+        cache_ttl: float = float(os.getenv("COMPRESSION_CACHE_TTL", "300")),
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = TTLCache(
+            "compressed", max_entries=cache_max_entries, max_bytes=cache_max_bytes, default_ttl=cache_ttl
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                if not self._compressible(message):
+                    passthrough = True
+                    await send(message)
+                    return
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            if message.get("more_body", False):
+                # Streamed body (e.g. a list piped from upstream, which may carry
+                # Content-Length): pass it through rather than buffering it
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+            body = message.get("body", b"")
+            if len(body) < self.minimum_size:
+                await send(start_message)
+                await send({"type": "http.response.body", "body": body})
+                return
+            compressed = self._compressed(body, encoding)
+            await send({**start_message, "headers": self._headers(start_message["headers"], encoding, len(compressed))})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _compressible(message) -> bool:
+        if message["status"] < 200 or message["status"] in (204, 304):
+            return False
+        has_length = False
+        for name, value in message.get("headers", []):
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type" and value.decode("latin-1").startswith(_SKIPPED_TYPES):
+                return False
+            if name == b"content-length":
+                has_length = True
+        # Without a Content-Length the body is streamed; compressing would buffer it
+        return has_length
+
+    def _compressed(self, body: bytes, encoding: str) -> bytes:
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+        cached = self.cache.get(key)
+        if cached is None:
+            cached = compress(body, encoding)
+            self.cache.set(key, cached, size=len(cached))
+        return cached
+
+    @staticmethod
+    def _headers(headers, encoding: str, length: int):
+        result = []
+        vary = None
+        for name, value in headers:
+            if name == b"content-length":
+                continue
+            if name == b"etag" and not value.startswith(b"W/"):
+                # The encoded representation is no longer byte-identical
+                value = b"W/" + value
+            if name == b"vary":
+                vary = value
+                continue
+            result.append((name, value))
+        result.append((b"content-encoding", encoding.encode("latin-1")))
+        result.append((b"content-length", str(length).encode("latin-1")))
+        if vary is None:
+            vary = b"Accept-Encoding"
+        elif b"accept-encoding" not in vary.lower():
+            vary = vary + b", Accept-Encoding"
+        result.append((b"vary", vary))
+        return result
@@ -1,11 +1,33 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+import compression
+from responses import FastJSONResponse
 from routers import users, movies, reviews, composite
+from services import downstream, metrics, tracing
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled HTTP client per downstream, reused across requests
+    await downstream.startup_all()
+    # Warms materialized movie-details in the background
+    await composite.startup()
+    try:
+        yield
+    finally:
+        await composite.shutdown()
+        await downstream.shutdown_all()
+
 
 app = FastAPI(
     title="Composite Microservice",
     description="Delegates operations to MS1, MS2, and MS3.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # Enable CORS for frontend
@@ -17,6 +39,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli for complete responses above COMPRESSION_MIN_SIZE
+if compression.COMPRESSION_ENABLED:
+    app.add_middleware(compression.CompressionMiddleware)
+
+# Request id / W3C trace context for downstream calls, and opt-in Server-Timing
+app.add_middleware(tracing.TracingMiddleware)
+
+# Outermost, so route latency includes tracing, compression and CORS handling
+app.add_middleware(metrics.RouteMetricsMiddleware)
+
 app.include_router(users.router, prefix="/composite")
 app.include_router(movies.router, prefix="/composite")
 app.include_router(reviews.router, prefix="/composite")
@@ -44,16 +76,19 @@ def root():
             ],
             "movies": [
                 "GET /composite/movies",
+                "GET /composite/movies?ids=1,2,3",
                 "POST /composite/movies",
                 "GET /composite/movies/{id}",
                 "PUT /composite/movies/{id}",
                 "DELETE /composite/movies/{id}",
                 "GET /composite/movies/{id}/people",
                 "POST /composite/movies/{id}/generate-share-card",
-                "GET /composite/movies/{id}/share-card-jobs/{job_id}"
+                "GET /composite/movies/{id}/share-card-jobs/{job_id}[?wait=]",
+                "GET /composite/movies/{id}/share-card-jobs/{job_id}/events"
             ],
             "people": [
                 "GET /composite/people",
+                "GET /composite/people?ids=1,2,3",
                 "POST /composite/people",
                 "GET /composite/people/{id}",
                 "PUT /composite/people/{id}",
@@ -63,13 +98,22 @@ def root():
             "reviews": [
                 "GET /composite/reviews",
                 "POST /composite/reviews",
+                "POST /composite/reviews:batch",
+                "GET /composite/reviews:export",
                 "GET /composite/reviews/{id}",
                 "PUT /composite/reviews/{id}",
                 "DELETE /composite/reviews/{id}",
                 "GET /composite/health"
             ],
             "composite": [
-                "GET /composite/movie-details/{id}"
+                "GET /composite/movie-details/{id}",
+                "GET /composite/stats",
+                "GET /metrics"
             ]
         }
     }
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,46 @@
+"""
+Field projection for composite responses (``?fields=movie.title,reviews.items.rating``).
+
+Fields are dotted paths; lists are projected element-wise, so
+``reviews.items.rating`` keeps only ``rating`` in every review item. A path
+that stops at an object keeps that whole object.
+"""
+from typing import Any, Dict, Optional
+
+FieldTree = Dict[str, "FieldTree"]
+
+
+def parse_fields(raw: Optional[str]) -> Optional[FieldTree]:
+    """Parse a comma-separated ``fields`` value into a nested tree; None/empty means everything."""
+    if not raw:
+        return None
+    tree: FieldTree = {}
+    for path in raw.split(","):
+        parts = [part.strip() for part in path.split(".") if part.strip()]
+        if not parts:
+            continue
+        node = tree
+        for depth, part in enumerate(parts):
+            if part in node and not node[part]:
+                break  # an ancestor path was already requested whole
+            if depth == len(parts) - 1:
+                node[part] = {}
+            else:
+                node = node.setdefault(part, {})
+    return tree or None
+
+
+def project(data: Any, tree: Optional[FieldTree]) -> Any:
+    """Prune ``data`` down to the paths in ``tree``."""
+    if not tree:
+        return data
+    if isinstance(data, list):
+        return [project(item, tree) for item in data]
+    if isinstance(data, dict):
+        return {key: project(data[key], subtree) for key, subtree in tree.items() if key in data}
+    return data
+
+
+def apply(data: Any, raw_fields: Optional[str]) -> Any:
+    """Parse ``raw_fields`` and project ``data`` with it."""
+    return project(data, parse_fields(raw_fields))
@@ -0,0 +1,44 @@
+"""
+Response classes shared by the routers.
+
+Route handlers that already hold plain JSON data (dicts/lists decoded from an
+upstream response) return ``FastJSONResponse`` directly, which skips FastAPI's
+``jsonable_encoder`` walk over the payload. With ``COMPOSITE_FAST_JSON=true``
+and ``orjson`` installed, rendering also switches from stdlib ``json`` to
+``orjson``.
+"""
+import json
+import os
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from services import tracing
+
+try:  # Optional dependency, only used when COMPOSITE_FAST_JSON is enabled
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+FAST_JSON = os.getenv("COMPOSITE_FAST_JSON", "false").lower() in {"1", "true", "yes"}
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize plain JSON data the same way FastJSONResponse renders it."""
+    if FAST_JSON and orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with ``dumps`` (orjson when enabled)."""
+
+    def render(self, content: Any) -> bytes:
+        with tracing.span("serialize"):
+            return dumps(content)
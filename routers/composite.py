@@ -1,69 +1,407 @@
 import asyncio
+import logging
+import os
+import time
+from typing import Optional
 from fastapi import APIRouter, HTTPException
-from services import ms2, ms3
+import projection
+from responses import FastJSONResponse
+from services import auth, downstream, existence, limiter, materialized, ms1, ms2, ms3, pagination, retry, tracing
+from services.cache import TTLCache
+from services.fanout import gather_bounded
+from services.materialized import MaterializedStore
+from services.singleflight import SingleFlight
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Seconds movie-details waits for its optional sections (cast/crew, reviews)
+MOVIE_DETAILS_DEADLINE = float(os.getenv("MOVIE_DETAILS_DEADLINE", "1.5"))
+
+# Stale-while-revalidate cache of aggregated movie-details documents: entries are
+# fresh for MOVIE_DETAILS_FRESH_TTL and kept for MOVIE_DETAILS_STALE_TTL so they
+# can be served while refreshing or when the upstreams fail.
+MOVIE_DETAILS_CACHE_ENABLED = os.getenv("MOVIE_DETAILS_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+MOVIE_DETAILS_FRESH_TTL = float(os.getenv("MOVIE_DETAILS_FRESH_TTL", "10"))
+MOVIE_DETAILS_STALE_TTL = float(os.getenv("MOVIE_DETAILS_STALE_TTL", "300"))
+
+_details_cache = TTLCache(
+    "movie-details",
+    max_entries=int(os.getenv("MOVIE_DETAILS_CACHE_MAX_ENTRIES", "1000")),
+    default_ttl=MOVIE_DETAILS_STALE_TTL,
+)
+_details_refreshes = SingleFlight()
+_background_tasks = set()
+_swr_stats = {"stale_served": 0, "stale_if_error": 0, "background_refreshes": 0}
+
+# Materialized movie-details for hot movies: MOVIE_DETAILS_HOT_IDS (comma-separated)
+# and/or MOVIE_DETAILS_HOT_IDS_FILE (one id per line, hottest first), capped at
+# MOVIE_DETAILS_HOT_TOP_N. Documents are built at startup. A write through this
+# instance that touches the movie or its reviews takes its document out of
+# service until the background rebuild finishes. Writes made
+# elsewhere (other instances, MS2/MS3 directly) are picked up once a document is
+# older than MOVIE_DETAILS_MATERIALIZED_MAX_AGE: it is then rebuilt in the
+# background while requests fall back to the stale-while-revalidate path.
+MOVIE_DETAILS_HOT_IDS = os.getenv("MOVIE_DETAILS_HOT_IDS", "")
+MOVIE_DETAILS_HOT_IDS_FILE = os.getenv("MOVIE_DETAILS_HOT_IDS_FILE", "")
+MOVIE_DETAILS_HOT_TOP_N = int(os.getenv("MOVIE_DETAILS_HOT_TOP_N", "100"))
+MOVIE_DETAILS_MATERIALIZED_MAX_AGE = float(os.getenv("MOVIE_DETAILS_MATERIALIZED_MAX_AGE", "60"))
+
+# expand=reviews.user,cast.person: referenced entities are fetched once per
+# distinct id, EXPAND_CONCURRENCY at a time (reviewers are cached in ms1)
+EXPAND_CONCURRENCY = int(os.getenv("EXPAND_CONCURRENCY", "8"))
+_EXPAND_ALIASES = {
+    "reviews.user": "reviews.user",
+    "reviews.items.user": "reviews.user",
+    "cast.person": "cast.person",
+    "cast_and_crew.person": "cast.person",
+}
+
 
 def _json_or_none(resp):
-    return resp.json() if resp.content else None
+    with tracing.span("decode"):
+        return resp.json() if resp.content else None
 
 
-@router.get("/movie-details/{movie_id}")
-async def composite_movie_details(movie_id: int):
+def _reviews_section_params(movie_id: int):
+    return {"movie_id": movie_id, "page": 1, "page_size": 10}
+
+
+_SECTION_FETCHERS = {
+    "cast_and_crew": lambda movie_id: ms2.get_movie_people(movie_id),
+    "reviews": lambda movie_id: ms3.list_reviews(_reviews_section_params(movie_id)),
+}
+_SECTION_DEFAULTS = {
+    "cast_and_crew": lambda: [],
+    "reviews": lambda: {"total": 0, "items": []},
+}
+
+
+async def _build_movie_details(movie_id: int, sections=None):
     """
-    Composite endpoint that aggregates movie data from multiple microservices.
-    Uses parallel execution (asyncio.gather) to fetch data concurrently from MS2 and MS3.
-    
-    This demonstrates:
-    - Parallel execution using asyncio.gather() for concurrent API calls
-    - Aggregation of data from multiple atomic microservices
+    Fetch and aggregate the movie-details document.
+
+    ``sections`` limits which optional sections (cast_and_crew, reviews) are
+    fetched; None means all of them, and skipped sections are left out.
+    Returns ``(payload, degraded)`` where ``degraded`` lists the optional sections
+    that failed or missed the response deadline and were filled with defaults.
     """
+    if sections is None:
+        sections = _SECTION_FETCHERS.keys()
+    # Parallel execution: fetch the movie and the requested sections concurrently
+    movie_task = asyncio.ensure_future(ms2.get_movie(movie_id))
+    tasks = {
+        name: asyncio.ensure_future(fetch(movie_id))
+        for name, fetch in _SECTION_FETCHERS.items()
+        if name in sections
+    }
+    deadline = asyncio.get_running_loop().time() + MOVIE_DETAILS_DEADLINE
     try:
-        # Parallel execution: fetch movie details and reviews concurrently
-        # This demonstrates threading/parallel execution requirement
-        movie_task = ms2.get_movie(movie_id)
-        people_task = ms2.get_movie_people(movie_id)
-        reviews_task = ms3.list_reviews({"movie_id": movie_id, "page": 1, "page_size": 10})
-        
-        # Execute all three requests in parallel using asyncio.gather
-        movie_resp, people_resp, reviews_resp = await asyncio.gather(
-            movie_task,
-            people_task,
-            reviews_task,
-            return_exceptions=True
-        )
-        
-        # Handle movie response
-        if isinstance(movie_resp, Exception):
-            raise HTTPException(status_code=404, detail=f"Movie {movie_id} not found")
-        
+        # The movie is mandatory, so it is awaited without the deadline
+        try:
+            movie_resp = await movie_task
+        except HTTPException as e:
+            # Only a real 404 means the movie is gone; outages keep their status
+            if e.status_code == 404:
+                raise HTTPException(status_code=404, detail=f"Movie {movie_id} not found")
+            raise
+
         movie_data = _json_or_none(movie_resp)
         if not movie_data:
             raise HTTPException(status_code=404, detail=f"Movie {movie_id} not found")
-        
-        # Handle people response (cast/crew)
-        people_data = []
-        if not isinstance(people_resp, Exception):
-            people_data = _json_or_none(people_resp) or []
-        
-        # Handle reviews response
-        reviews_data = {"total": 0, "items": []}
-        if not isinstance(reviews_resp, Exception):
-            reviews_data = _json_or_none(reviews_resp) or reviews_data
-        
-        # Aggregate all data
-        return {
-            "movie": movie_data,
-            "cast_and_crew": people_data,
-            "reviews": reviews_data,
-            "_links": {
-                "self": f"/composite/movie-details/{movie_id}",
-                "movie": f"/composite/movies/{movie_id}",
-                "reviews": f"/composite/reviews?movie_id={movie_id}"
-            }
+
+        # Optional sections get whatever time is left; stragglers are cancelled below
+        remaining = max(0.0, deadline - asyncio.get_running_loop().time())
+        done = set()
+        if tasks:
+            done, _ = await asyncio.wait(tasks.values(), timeout=remaining)
+    finally:
+        for task in (movie_task, *tasks.values()):
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # mark retrieved so failures aren't logged as unhandled
+
+    payload = {"movie": movie_data}
+    degraded = []
+    for name, task in tasks.items():
+        data = None
+        if task not in done or task.exception() is not None:
+            degraded.append(name)
+        else:
+            data = _json_or_none(task.result())
+        payload[name] = data or _SECTION_DEFAULTS[name]()
+
+    if "reviews" in payload:
+        # Continue with GET /composite/reviews?cursor=<next_cursor>
+        payload["reviews"] = pagination.with_next_cursor(payload["reviews"], _reviews_section_params(movie_id))
+
+    payload.update({
+        "_links": {
+            "self": f"/composite/movie-details/{movie_id}",
+            "movie": f"/composite/movies/{movie_id}",
+            "reviews": f"/composite/reviews?movie_id={movie_id}"
         }
-        
-    except HTTPException:
+    })
+    return payload, degraded
+
+
+def _hot_movie_ids():
+    """Parse the configured hot movie ids, logging and skipping anything unusable."""
+    raw = MOVIE_DETAILS_HOT_IDS.replace(",", "\n")
+    if MOVIE_DETAILS_HOT_IDS_FILE:
+        try:
+            with open(MOVIE_DETAILS_HOT_IDS_FILE) as f:
+                raw += "\n" + f.read()
+        except OSError as e:
+            logger.error("Cannot read MOVIE_DETAILS_HOT_IDS_FILE: %s", e)
+    ids = []
+    for line in raw.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            ids.append(int(line))
+        except ValueError:
+            logger.error("Ignoring invalid hot movie id %r", line)
+    return list(dict.fromkeys(ids))[:MOVIE_DETAILS_HOT_TOP_N]
+
+
+async def _materialize(movie_id: int):
+    """Build a complete document for the store; degraded sections keep the previous copy."""
+    with limiter.priority(limiter.LOW):
+        payload, degraded = await _build_movie_details(movie_id)
+    if degraded:
+        previous = _materialized.previous(movie_id)
+        if previous is None:
+            return None
+        payload = {**payload, **{section: previous["payload"][section] for section in degraded}}
+    return payload
+
+
+_materialized = MaterializedStore("movie-details", _materialize, max_age=MOVIE_DETAILS_MATERIALIZED_MAX_AGE)
+
+
+def _movie_changed(movie_id: int) -> None:
+    # A write went through the composite: never serve the old aggregate again
+    _details_cache.delete(movie_id)
+    _materialized.changed(movie_id)
+
+
+materialized.on_movie_changed(_movie_changed)
+
+
+async def startup() -> None:
+    _materialized.track(_hot_movie_ids())
+    _materialized.start()
+
+
+async def shutdown() -> None:
+    await _materialized.stop()
+
+
+def _movie_details_response(payload, degraded, fields=None):
+    """Render movie-details, projected to ``fields`` and flagging degraded sections."""
+    headers = {}
+    payload = projection.project(payload, fields)
+    if degraded:
+        payload = {**payload, "_degraded": degraded}
+        headers["X-Degraded-Sections"] = ",".join(degraded)
+    # Plain JSON already, so skip jsonable_encoder
+    return FastJSONResponse(payload, headers=headers)
+
+
+async def _refresh_movie_details(movie_id: int):
+    """
+    Rebuild movie-details and update the SWR cache.
+
+    Complete documents replace the cached copy. If a section degrades and a
+    previous copy exists, that section is served from the previous copy
+    (stale-if-error) and the cache keeps the old entry so the next request
+    retries the refresh. Returns ``(payload, degraded)``.
+    """
+    previous = _details_cache.get(movie_id)
+    try:
+        payload, degraded = await _build_movie_details(movie_id)
+    except HTTPException as e:
+        if e.status_code == 404:
+            _details_cache.delete(movie_id)
+        elif previous is not None:
+            _swr_stats["stale_if_error"] += 1
+            return previous["payload"], []
         raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error aggregating movie details: {str(e)}")
+
+    if not degraded:
+        _details_cache.set(movie_id, {"payload": payload, "fetched_at": time.monotonic()})
+    elif previous is not None:
+        _swr_stats["stale_if_error"] += 1
+        payload = {**payload, **{section: previous["payload"][section] for section in degraded}}
+        degraded = []
+    return payload, degraded
+
+
+async def _refresh_movie_details_low_priority(movie_id: int):
+    # Nobody is waiting on a background refresh, so it yields to interactive reads
+    with limiter.priority(limiter.LOW):
+        return await _refresh_movie_details(movie_id)
+
+
+def _refresh_in_background(movie_id: int) -> None:
+    task = asyncio.ensure_future(
+        _details_refreshes.do((movie_id, limiter.LOW), lambda: _refresh_movie_details_low_priority(movie_id))
+    )
+    _background_tasks.add(task)
+    task.add_done_callback(_finish_background_refresh)
+
+
+def _finish_background_refresh(task: asyncio.Task) -> None:
+    _background_tasks.discard(task)
+    # Failures are already covered by serving the stale copy
+    if not task.cancelled():
+        task.exception()
+    _swr_stats["background_refreshes"] += 1
+
+
+async def _expanded_user(user_id):
+    """Fetch the public fields of a reviewer from MS1 for expand=reviews.user."""
+    return await ms1.get_public_user(user_id)
+
+
+async def _expanded_person(person_id):
+    """Fetch a cast/crew member from MS2 for expand=cast.person (cached in the ms2 client)."""
+    return _json_or_none(await ms2.get_person(person_id))
+
+
+async def _resolve(ids, fetch):
+    """Fetch each distinct id once with bounded concurrency; failures resolve to None."""
+    unique = list(dict.fromkeys(entity_id for entity_id in ids if entity_id is not None))
+    results = await gather_bounded((fetch(entity_id) for entity_id in unique), EXPAND_CONCURRENCY)
+    return {
+        entity_id: None if isinstance(result, Exception) else result
+        for entity_id, result in zip(unique, results)
+    }
+
+
+async def _expand_movie_details(payload, expand, tree=None):
+    """
+    Embed referenced entities into a copy of ``payload``: ``reviews.user`` adds
+    "user" to each review item and ``cast.person`` adds "person" to each
+    cast/crew entry. Sections excluded by the field ``tree`` are not expanded.
+    """
+    def wanted(section):
+        return section in payload and (tree is None or section in tree)
+
+    reviews = payload.get("reviews") or {}
+    review_items = (reviews.get("items") or []) if isinstance(reviews, dict) else []
+    cast = payload.get("cast_and_crew") or []
+
+    lookups = {}
+    if "reviews.user" in expand and wanted("reviews"):
+        lookups["users"] = _resolve((item.get("user_id") for item in review_items), _expanded_user)
+    if "cast.person" in expand and wanted("cast_and_crew"):
+        lookups["people"] = _resolve((entry.get("person_id") for entry in cast), _expanded_person)
+    if not lookups:
+        return payload
+
+    resolved = dict(zip(lookups, await asyncio.gather(*lookups.values())))
+    payload = dict(payload)
+    if "users" in resolved:
+        users = resolved["users"]
+        payload["reviews"] = {
+            **reviews,
+            "items": [{**item, "user": users.get(item.get("user_id"))} for item in review_items],
+        }
+    if "people" in resolved:
+        people = resolved["people"]
+        payload["cast_and_crew"] = [{**entry, "person": people.get(entry.get("person_id"))} for entry in cast]
+    return payload
+
+
+def _parse_expand(expand: Optional[str]):
+    if not expand:
+        return set()
+    requested = {_EXPAND_ALIASES.get(part.strip(), part.strip()) for part in expand.split(",") if part.strip()}
+    unknown = requested - set(_EXPAND_ALIASES.values())
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported expand value(s): {', '.join(sorted(unknown))}; use reviews.user, cast.person",
+        )
+    return requested
+
+
+@router.get("/movie-details/{movie_id}")
+async def composite_movie_details(movie_id: int, fields: Optional[str] = None, expand: Optional[str] = None):
+    """
+    Composite endpoint that aggregates movie data from multiple microservices.
+    Fetches the movie, its cast/crew and its reviews concurrently from MS2 and MS3.
+
+    The movie is mandatory. Cast/crew and reviews must finish within
+    MOVIE_DETAILS_DEADLINE seconds of the request; sections that fail or run
+    late are cancelled, returned empty and listed under "_degraded" and in
+    the X-Degraded-Sections header.
+
+    Aggregates are cached stale-while-revalidate: fresh copies are served as-is,
+    copies older than MOVIE_DETAILS_FRESH_TTL are served immediately while a
+    background refresh runs, and a stale copy is served if the refresh fails.
+
+    ``fields`` (e.g. ``movie.title,reviews.items.rating``) prunes the response;
+    sections it doesn't mention are not fetched at all on a cache miss.
+
+    ``expand`` (``reviews.user``, ``cast.person``) embeds the referenced users
+    and people, fetched once per distinct id from MS1/MS2.
+    """
+    limiter.set_priority(limiter.HIGH)
+    expansions = _parse_expand(expand)
+    tree = projection.parse_fields(fields)
+    # Only full documents are cached, so a request that skips sections bypasses the cache on a miss
+    sections = None if tree is None else [name for name in _SECTION_FETCHERS if name in tree]
+    partial = sections is not None and len(sections) < len(_SECTION_FETCHERS)
+
+    document = _materialized.get(movie_id)
+    entry = _details_cache.get(movie_id) if MOVIE_DETAILS_CACHE_ENABLED and document is None else None
+    if document is not None:
+        payload, degraded = document["payload"], []
+        cache_status = "MATERIALIZED"
+    elif entry is not None:
+        payload, degraded = entry["payload"], []
+        if time.monotonic() - entry["fetched_at"] < MOVIE_DETAILS_FRESH_TTL:
+            cache_status = "HIT"
+        else:
+            cache_status = "STALE"
+            _swr_stats["stale_served"] += 1
+            _refresh_in_background(movie_id)
+    else:
+        cache_status = "MISS"
+        try:
+            if MOVIE_DETAILS_CACHE_ENABLED and not partial:
+                # Keyed by priority so this read never waits behind a low-priority background refresh
+                payload, degraded = await _details_refreshes.do(
+                    (movie_id, limiter.current_priority()), lambda: _refresh_movie_details(movie_id)
+                )
+            else:
+                payload, degraded = await _build_movie_details(movie_id, sections)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error aggregating movie details: {str(e)}")
+
+    if expansions:
+        payload = await _expand_movie_details(payload, expansions, tree)
+    response = _movie_details_response(payload, degraded, tree)
+    response.headers["X-Cache"] = cache_status
+    return response
+
+
+@router.get("/stats")
+async def composite_stats():
+    """Per-downstream request and cache statistics (hits/misses/evictions) for sizing."""
+    stats = {client.name: client.stats() for client in downstream.all_clients()}
+    stats["existence_cache"] = existence.stats()
+    stats["auth"] = auth.stats()
+    stats["share_card_jobs"] = ms2.share_card_jobs.stats()
+    stats["retry_budget"] = retry.BUDGET.stats()
+    stats["movie_details_cache"] = {**_details_cache.stats(), **_swr_stats}
+    stats["movie_details_materialized"] = _materialized.stats()
+    stats["review_pages"] = ms3.review_pages.stats()
+    return FastJSONResponse(stats)
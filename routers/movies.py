@@ -1,12 +1,30 @@
+import asyncio
+import os
 from urllib.parse import urljoin
 
-from fastapi import APIRouter, Request, Response
-from services import ms2
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+import projection
+from responses import FastJSONResponse, dumps
+from services import ms2, tracing
+from services.downstream import etag_matches, streaming_response
+from services.fanout import gather_bounded
 
 router = APIRouter()
 
+# Limits for batch reads (GET /movies?ids=..., GET /people?ids=...)
+BATCH_READ_MAX_IDS = int(os.getenv("BATCH_READ_MAX_IDS", "200"))
+BATCH_READ_CONCURRENCY = int(os.getenv("BATCH_READ_CONCURRENCY", "16"))
+
+# Share-card job status: longest ?wait= honoured, and SSE keep-alive interval
+SHARE_CARD_MAX_WAIT = float(os.getenv("SHARE_CARD_MAX_WAIT", "30"))
+SHARE_CARD_SSE_KEEPALIVE = float(os.getenv("SHARE_CARD_SSE_KEEPALIVE", "15"))
+
 def _json_or_none(resp):
-    return resp.json() if resp.content else None
+    with tracing.span("decode"):
+        return resp.json() if resp.content else None
 
 
 def _rewrite_card_url(data):
@@ -18,11 +36,52 @@ def _rewrite_card_url(data):
     return data
 
 
+def _parse_ids(raw: str) -> list:
+    """Parse a comma-separated id list, dropping duplicates but keeping order."""
+    try:
+        ids = list(dict.fromkeys(int(part) for part in raw.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if len(ids) > BATCH_READ_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_READ_MAX_IDS} ids per request")
+    return ids
+
+
+async def _batch_get(raw_ids: str, fetch, fields: Optional[str] = None):
+    """
+    Fetch many entities concurrently, keyed by id. Failures are reported per id
+    under "errors" instead of failing the whole batch. ``fields`` applies to
+    each entity.
+    """
+    ids = _parse_ids(raw_ids)
+    tree = projection.parse_fields(fields)
+    results = await gather_bounded((fetch(entity_id) for entity_id in ids), BATCH_READ_CONCURRENCY)
+    items, errors = {}, {}
+    for entity_id, result in zip(ids, results):
+        if isinstance(result, HTTPException):
+            errors[str(entity_id)] = {"status_code": result.status_code, "detail": result.detail}
+        elif isinstance(result, Exception):
+            errors[str(entity_id)] = {"status_code": 500, "detail": str(result)}
+        else:
+            items[str(entity_id)] = projection.project(_json_or_none(result), tree)
+    return FastJSONResponse({"items": items, "errors": errors})
+
+
 @router.get("/movies")
 async def composite_list_movies(request: Request):
-    # Proxy query params directly to MS2
-    upstream = await ms2.list_movies(dict(request.query_params))
-    return _json_or_none(upstream)
+    params = dict(request.query_params)
+    fields = params.pop("fields", None)
+    # ?ids=1,2,3 fetches those movies by id in one composite call
+    if "ids" in params:
+        return await _batch_get(params["ids"], ms2.get_movie, fields)
+
+    # Proxy query params directly to MS2, streaming the body through untouched
+    # unless it has to be projected
+    if ms2.STREAM_LISTS and not fields:
+        accept_encoding = request.headers.get("accept-encoding")
+        return streaming_response(await ms2.stream_movies(params, accept_encoding), accept_encoding)
+    upstream = await ms2.list_movies(params)
+    return FastJSONResponse(projection.apply(_json_or_none(upstream), fields))
 
 
 @router.post("/movies")
@@ -33,7 +92,7 @@ async def composite_create_movie(body: dict, response: Response):
 
 
 @router.get("/movies/{movie_id}")
-async def composite_get_movie(movie_id: int, request: Request, response: Response):
+async def composite_get_movie(movie_id: int, request: Request, fields: Optional[str] = None):
     headers = {}
     if_none_match = request.headers.get("if-none-match")
     if if_none_match:
@@ -41,14 +100,15 @@ async def composite_get_movie(movie_id: int, request: Request, response: Respons
 
     upstream = await ms2.get_movie(movie_id, headers=headers)
 
-    if etag := upstream.headers.get("etag"):
-        response.headers["ETag"] = etag
+    etag = upstream.headers.get("etag")
+    response_headers = {"ETag": etag} if etag else None
+    # The stored ETag is revalidated upstream, so a matching client tag is answered here
+    if upstream.status_code == 304 or etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=response_headers)
 
-    response.status_code = upstream.status_code
-    if upstream.status_code == 304:
-        return None
-
-    return _json_or_none(upstream)
+    return FastJSONResponse(
+        projection.apply(_json_or_none(upstream), fields), status_code=upstream.status_code, headers=response_headers
+    )
 
 
 @router.put("/movies/{movie_id}")
@@ -66,9 +126,9 @@ async def composite_delete_movie(movie_id: int, response: Response):
 
 
 @router.get("/movies/{movie_id}/people")
-async def composite_movie_people(movie_id: int):
+async def composite_movie_people(movie_id: int, fields: Optional[str] = None):
     upstream = await ms2.get_movie_people(movie_id)
-    return _json_or_none(upstream)
+    return FastJSONResponse(projection.apply(_json_or_none(upstream), fields))
 
 
 # Share card job endpoints ----------------------------------------------------
@@ -81,17 +141,78 @@ async def composite_generate_share_card(movie_id: int, response: Response):
 
 
 @router.get("/movies/{movie_id}/share-card-jobs/{job_id}")
-async def composite_get_share_card_job_status(movie_id: int, job_id: str):
+async def composite_get_share_card_job_status(movie_id: int, job_id: str, wait: Optional[float] = None):
+    """
+    Job status. With ``?wait=<seconds>`` (long-poll, capped at SHARE_CARD_MAX_WAIT)
+    the response is held until the job finishes or the wait expires; all
+    waiting clients share one MS2 poller per job.
+    """
+    if wait is not None and wait > 0:
+        data = await ms2.share_card_jobs.wait((movie_id, job_id), min(wait, SHARE_CARD_MAX_WAIT))
+        if data is not None:
+            return FastJSONResponse(_rewrite_card_url(data))
     upstream = await ms2.get_share_card_job_status(movie_id, job_id)
     data = _json_or_none(upstream)
-    return _rewrite_card_url(data)
+    return FastJSONResponse(_rewrite_card_url(data))
+
+
+def _sse(event: str, data) -> bytes:
+    return b"event: " + event.encode("utf-8") + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+@router.get("/movies/{movie_id}/share-card-jobs/{job_id}/events")
+async def composite_share_card_job_events(movie_id: int, job_id: str):
+    """
+    Server-Sent Events stream of job status changes, ending after the final
+    status (``card_url`` ready or failed). Backed by the same shared poller as
+    ``?wait=``; failures are sent as an ``error`` event.
+    """
+    async def events():
+        updates = ms2.share_card_jobs.watch((movie_id, job_id))
+        pending = None
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(updates.__anext__())
+                done, _ = await asyncio.wait({pending}, timeout=SHARE_CARD_SSE_KEEPALIVE)
+                if not done:
+                    yield b": keep-alive\n\n"
+                    continue
+                try:
+                    status = pending.result()
+                except StopAsyncIteration:
+                    return
+                pending = None
+                yield _sse("status", _rewrite_card_url(status))
+        except HTTPException as exc:
+            yield _sse("error", {"status_code": exc.status_code, "detail": exc.detail})
+        finally:
+            if pending is not None:
+                pending.cancel()
+                await asyncio.wait({pending})
+            await updates.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # People endpoints ------------------------------------------------------------
 @router.get("/people")
 async def composite_list_people(request: Request):
-    upstream = await ms2.list_people(dict(request.query_params))
-    return _json_or_none(upstream)
+    params = dict(request.query_params)
+    fields = params.pop("fields", None)
+    # ?ids=1,2,3 fetches those people by id in one composite call
+    if "ids" in params:
+        return await _batch_get(params["ids"], ms2.get_person, fields)
+
+    if ms2.STREAM_LISTS and not fields:
+        accept_encoding = request.headers.get("accept-encoding")
+        return streaming_response(await ms2.stream_people(params, accept_encoding), accept_encoding)
+    upstream = await ms2.list_people(params)
+    return FastJSONResponse(projection.apply(_json_or_none(upstream), fields))
 
 
 @router.post("/people")
@@ -102,10 +223,9 @@ async def composite_create_person(body: dict, response: Response):
 
 
 @router.get("/people/{person_id}")
-async def composite_get_person(person_id: int, response: Response):
+async def composite_get_person(person_id: int, fields: Optional[str] = None):
     upstream = await ms2.get_person(person_id)
-    response.status_code = upstream.status_code
-    return _json_or_none(upstream)
+    return FastJSONResponse(projection.apply(_json_or_none(upstream), fields), status_code=upstream.status_code)
 
 
 @router.put("/people/{person_id}")
@@ -123,6 +243,6 @@ async def composite_delete_person(person_id: int, response: Response):
 
 
 @router.get("/people/{person_id}/movies")
-async def composite_person_movies(person_id: int):
+async def composite_person_movies(person_id: int, fields: Optional[str] = None):
     upstream = await ms2.get_person_movies(person_id)
-    return _json_or_none(upstream)
+    return FastJSONResponse(projection.apply(_json_or_none(upstream), fields))
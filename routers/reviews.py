@@ -1,11 +1,73 @@
+import asyncio
+import json
+import os
+from collections import deque
 from fastapi import APIRouter, Request, Response, HTTPException
-from typing import Optional
-from services import ms1, ms2, ms3
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Optional
+import projection
+from responses import FastJSONResponse
+from services import downstream, existence, limiter, ms1, ms2, ms3, pagination, tracing
+from services.downstream import etag_matches, streaming_response
+from services.fanout import cancel_all, gather_bounded, start_bounded
+
+# Bulk ingestion limits for POST /reviews:batch
+BATCH_MAX_ITEMS = int(os.getenv("REVIEW_BATCH_MAX_ITEMS", "5000"))
+BATCH_CONCURRENCY = int(os.getenv("REVIEW_BATCH_CONCURRENCY", "16"))
+
+# Full export (GET /reviews:export): page size, pages fetched at once, and page cap
+EXPORT_PAGE_SIZE = int(os.getenv("REVIEW_EXPORT_PAGE_SIZE", "100"))
+EXPORT_CONCURRENCY = int(os.getenv("REVIEW_EXPORT_CONCURRENCY", "4"))
+EXPORT_MAX_PAGES = int(os.getenv("REVIEW_EXPORT_MAX_PAGES", "1000"))
 
 router = APIRouter()
 
 def _json_or_none(resp):
-    return resp.json() if resp.content else None
+    with tracing.span("decode"):
+        return resp.json() if resp.content else None
+
+
+async def _check_movie(movie_id: int) -> Optional[str]:
+    """Return an error message if movie_id does not exist in MS2, else None."""
+    cached = existence.lookup("movie", movie_id)
+    if cached is not None:
+        return None if cached else f"Movie with id {movie_id} does not exist"
+    try:
+        movie_resp = await ms2.get_movie(movie_id)
+        if movie_resp.status_code != 200:
+            return f"Movie with id {movie_id} does not exist"
+        existence.remember("movie", movie_id, True)
+    except HTTPException as e:
+        if e.status_code == 404:
+            existence.remember("movie", movie_id, False)
+            return f"Movie with id {movie_id} does not exist"
+        return f"Error validating movie: {e.detail}"
+    except Exception as e:
+        return f"Error validating movie: {str(e)}"
+    return None
+
+
+async def _check_user(user_id: int) -> Optional[str]:
+    """Return an error message if user_id does not exist in MS1, else None."""
+    cached = existence.lookup("user", user_id)
+    if cached is not None:
+        return None if cached else f"User with id {user_id} does not exist"
+    try:
+        # Note: MS1 uses string UUIDs, but reviews use int user_id
+        # Convert to string for MS1 lookup
+        user_resp = await ms1.get_user(str(user_id))
+        if user_resp.status_code != 200:
+            return f"User with id {user_id} does not exist"
+        existence.remember("user", user_id, True)
+    except HTTPException as e:
+        if e.status_code == 404:
+            existence.remember("user", user_id, False)
+            return f"User with id {user_id} does not exist"
+        return f"Error validating user: {e.detail}"
+    except Exception:
+        # If validation fails, add to errors
+        return f"User with id {user_id} does not exist or validation failed"
+    return None
 
 
 async def _validate_foreign_keys(movie_id: Optional[int], user_id: Optional[int]):
@@ -15,39 +77,17 @@ async def _validate_foreign_keys(movie_id: Optional[int], user_id: Optional[int]
     
     - movie_id must exist in MS2 (Movies service)
     - user_id must exist in MS1 (Users service)
+
+    Both checks run concurrently and consult a short-lived existence cache, so
+    reviews for the same movie/user don't re-fetch it each time.
     """
-    errors = []
-    
-    # Validate movie_id exists in MS2
+    checks = []
     if movie_id is not None:
-        try:
-            movie_resp = await ms2.get_movie(movie_id)
-            if movie_resp.status_code != 200:
-                errors.append(f"Movie with id {movie_id} does not exist")
-        except HTTPException as e:
-            if e.status_code == 404:
-                errors.append(f"Movie with id {movie_id} does not exist")
-            else:
-                errors.append(f"Error validating movie: {e.detail}")
-        except Exception as e:
-            errors.append(f"Error validating movie: {str(e)}")
-    
-    # Validate user_id exists in MS1
+        checks.append(_check_movie(movie_id))
     if user_id is not None:
-        try:
-            # Note: MS1 uses string UUIDs, but reviews use int user_id
-            # Convert to string for MS1 lookup
-            user_resp = await ms1.get_user(str(user_id))
-            if user_resp.status_code != 200:
-                errors.append(f"User with id {user_id} does not exist")
-        except HTTPException as e:
-            if e.status_code == 404:
-                errors.append(f"User with id {user_id} does not exist")
-            else:
-                errors.append(f"Error validating user: {e.detail}")
-        except Exception as e:
-            # If validation fails, add to errors
-            errors.append(f"User with id {user_id} does not exist or validation failed")
+        checks.append(_check_user(user_id))
+
+    errors = [error for error in await asyncio.gather(*checks) if error]
     
     if errors:
         raise HTTPException(
@@ -61,10 +101,28 @@ async def _validate_foreign_keys(movie_id: Optional[int], user_id: Optional[int]
 
 @router.get("/reviews")
 async def composite_list_reviews(request: Request):
-    """List reviews with filtering and pagination."""
-    # Forward all query parameters to MS3
-    upstream = await ms3.list_reviews(dict(request.query_params))
-    return _json_or_none(upstream)
+    """
+    List reviews with filtering and pagination.
+
+    With ``cursor`` (empty for the first page, then each response's
+    ``next_cursor``) the filters and page travel in an opaque token, and the
+    following page is prefetched so walking the list doesn't wait on MS3.
+    """
+    params = dict(request.query_params)
+    fields = params.pop("fields", None)
+    cursor = params.pop("cursor", None)
+    if cursor is not None:
+        if cursor:
+            params = pagination.decode_cursor(cursor)
+        data = await ms3.review_pages.get(params)
+        return FastJSONResponse(projection.apply(pagination.with_next_cursor(data, params), fields))
+    # Forward all query parameters to MS3, streaming the body through untouched
+    # unless it has to be projected
+    if ms3.STREAM_LISTS and not fields:
+        accept_encoding = request.headers.get("accept-encoding")
+        return streaming_response(await ms3.stream_reviews(params, accept_encoding), accept_encoding)
+    data = await ms3.review_pages.get(params)
+    return FastJSONResponse(projection.apply(data, fields))
 
 
 @router.post("/reviews")
@@ -88,8 +146,201 @@ async def composite_create_review(body: dict, response: Response):
     return _json_or_none(upstream)
 
 
+async def _parse_batch(request: Request) -> List[Any]:
+    """Read a JSON array or NDJSON body; malformed NDJSON lines become None items."""
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        items: List[Any] = []
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            items.extend(_parse_ndjson_line(line) for line in lines if line.strip())
+            if len(items) > BATCH_MAX_ITEMS:
+                break
+        if buffer.strip():
+            items.append(_parse_ndjson_line(buffer))
+    else:
+        try:
+            items = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_ITEMS} reviews")
+    return items
+
+
+def _batch_key(value: Any) -> Optional[str]:
+    """
+    Deduplication key for a batch id. Every non-None value is validated like
+    POST /reviews does; JSON keeps 1, 1.0 and "1" apart and handles unhashable values.
+    """
+    return None if value is None else json.dumps(value, sort_keys=True, default=str)
+
+
+def _distinct_ids(objects: List[Dict[str, Any]], field: str) -> Dict[str, Any]:
+    """Map the batch key of each distinct non-None ``field`` value to the value itself."""
+    ids: Dict[str, Any] = {}
+    for item in objects:
+        value = item.get(field)
+        if value is not None:
+            ids.setdefault(_batch_key(value), value)
+    return ids
+
+
+def _parse_ndjson_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+async def _create_batch_item(index: int, body: Any, movie_errors: Dict[Any, Optional[str]], user_errors: Dict[Any, Optional[str]]) -> Dict[str, Any]:
+    """Validate one batch item against the pre-computed FK results and create it in MS3."""
+    if not isinstance(body, dict):
+        return {"index": index, "status": 400, "error": "Item must be a JSON object"}
+
+    errors = [
+        error
+        for error in (
+            movie_errors.get(_batch_key(body.get("movie_id"))),
+            user_errors.get(_batch_key(body.get("user_id"))),
+        )
+        if error
+    ]
+    if errors:
+        return {
+            "index": index,
+            "status": 400,
+            "error": {"message": "Foreign key validation failed", "errors": errors},
+        }
+
+    try:
+        upstream = await ms3.create_review(body)
+    except HTTPException as e:
+        return {"index": index, "status": e.status_code, "error": e.detail}
+    except Exception as e:
+        return {"index": index, "status": 500, "error": str(e)}
+    return {"index": index, "status": upstream.status_code, "body": _json_or_none(upstream)}
+
+
+@router.post("/reviews:batch")
+async def composite_create_reviews_batch(request: Request):
+    """
+    Create many reviews in one call from a JSON array or NDJSON body.
+
+    Movie and user ids are deduplicated and validated once each (same checks as
+    POST /reviews), then creates run against MS3 with bounded concurrency. Results
+    stream back as NDJSON lines ``{"index", "status", "body" | "error"}`` in
+    completion order. If the client disconnects, creates not yet finished are
+    cancelled; one already sent to MS3 may still have been applied.
+    """
+    items = await _parse_batch(request)
+
+    async def results():
+        objects = [item for item in items if isinstance(item, dict)]
+        movie_ids = _distinct_ids(objects, "movie_id")
+        user_ids = _distinct_ids(objects, "user_id")
+        movie_checks, user_checks = await asyncio.gather(
+            gather_bounded((_check_movie(movie_id) for movie_id in movie_ids.values()), BATCH_CONCURRENCY),
+            gather_bounded((_check_user(user_id) for user_id in user_ids.values()), BATCH_CONCURRENCY),
+        )
+        movie_errors = dict(zip(movie_ids, movie_checks))
+        user_errors = dict(zip(user_ids, user_checks))
+
+        creates = (
+            _create_batch_item(index, body, movie_errors, user_errors)
+            for index, body in enumerate(items)
+        )
+        tasks = start_bounded(creates, BATCH_CONCURRENCY)
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield json.dumps(await next_result, default=str) + "\n"
+        finally:
+            await cancel_all(tasks)
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+async def _export_page(params: Dict[str, Any], page: int, page_size: int) -> Dict[str, Any]:
+    # Bulk export yields to interactive traffic at the downstream limiter
+    with limiter.priority(limiter.LOW):
+        upstream = await ms3.list_reviews({**params, "page": page, "page_size": page_size})
+    data = _json_or_none(upstream)
+    return data if isinstance(data, dict) else {"items": []}
+
+
+@router.get("/reviews:export")
+async def composite_export_reviews(request: Request):
+    """
+    Stream every review matching the filters as NDJSON, one review per line.
+
+    The first page gives the total; the remaining pages are fetched
+    REVIEW_EXPORT_CONCURRENCY at a time and written in order. Exports needing
+    more than REVIEW_EXPORT_MAX_PAGES pages are refused with 413 up front; if
+    MS3 reports no total, hitting the cap ends the stream with an
+    ``{"error": {"truncated": true, ...}}`` line. Any other failure after the
+    stream has started ends it with an ``{"error": ...}`` line. Pages are
+    offset-based, so reviews written during an export may be skipped or repeated.
+    """
+    params = dict(request.query_params)
+    params.pop("page", None)
+    try:
+        page_size = max(1, min(int(params.pop("page_size", EXPORT_PAGE_SIZE)), EXPORT_PAGE_SIZE))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="page_size must be an integer")
+    # Fetched before streaming so an unreachable MS3 still gets a proper status code
+    first = await _export_page(params, 1, page_size)
+    total = first.get("total")
+    last_page = max(1, -(-total // page_size)) if isinstance(total, int) else None
+    if last_page is not None and last_page > EXPORT_MAX_PAGES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Export of {total} reviews exceeds {EXPORT_MAX_PAGES * page_size}; narrow the filters",
+        )
+
+    async def lines():
+        pending: "deque[asyncio.Future]" = deque()
+        next_page = 2
+        try:
+            data = first
+            while True:
+                for item in data.get("items") or []:
+                    yield json.dumps(item, default=str) + "\n"
+                if last_page is None:
+                    # Unknown total: walk sequentially until a short page
+                    if len(data.get("items") or []) < page_size:
+                        return
+                    if next_page > EXPORT_MAX_PAGES:
+                        truncated = {
+                            "truncated": True,
+                            "status_code": 413,
+                            "detail": f"Export stopped after {EXPORT_MAX_PAGES * page_size} reviews",
+                        }
+                        yield json.dumps({"error": truncated}) + "\n"
+                        return
+                    data = await _export_page(params, next_page, page_size)
+                    next_page += 1
+                    continue
+                while next_page <= last_page and len(pending) < EXPORT_CONCURRENCY:
+                    pending.append(asyncio.ensure_future(_export_page(params, next_page, page_size)))
+                    next_page += 1
+                if not pending:
+                    return
+                data = await pending.popleft()
+        except HTTPException as e:
+            yield json.dumps({"error": {"status_code": e.status_code, "detail": e.detail}}, default=str) + "\n"
+        finally:
+            await cancel_all(pending)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @router.get("/reviews/{review_id}")
-async def composite_get_review(review_id: int, request: Request, response: Response):
+async def composite_get_review(review_id: int, request: Request, fields: Optional[str] = None):
     """Get a review by ID. Supports ETag via If-None-Match header."""
     headers = {}
     if_none_match = request.headers.get("if-none-match")
@@ -99,16 +350,16 @@ async def composite_get_review(review_id: int, request: Request, response: Respo
     upstream = await ms3.get_review(review_id, headers=headers)
 
     # Forward ETag header if present
-    if "etag" in upstream.headers:
-        response.headers["ETag"] = upstream.headers["etag"]
+    etag = upstream.headers.get("etag")
+    response_headers = {"ETag": etag} if etag else None
 
-    response.status_code = upstream.status_code
-    
-    # Handle 304 Not Modified
-    if upstream.status_code == 304:
-        return None
+    # Handle 304 Not Modified, answering locally when the revalidated ETag matches
+    if upstream.status_code == 304 or etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=response_headers)
 
-    return _json_or_none(upstream)
+    return FastJSONResponse(
+        projection.apply(_json_or_none(upstream), fields), status_code=upstream.status_code, headers=response_headers
+    )
 
 
 @router.put("/reviews/{review_id}")
@@ -134,6 +385,7 @@ async def composite_health_check():
 
     Returns composite status plus downstream MS3 status, but will not raise if MS3
     is unavailable—useful for uptime probes to reflect the composite’s own health.
+    Circuit breaker state for every downstream is reported under "circuit_breakers".
     """
     ms3_status = {"ok": False}
     try:
@@ -146,9 +398,18 @@ async def composite_health_check():
     except Exception as exc:  # pragma: no cover - defensive path
         ms3_status.update({"error": str(exc)})
 
-    overall_ok = ms3_status.get("ok", False)
+    breakers = {
+        client.name: client.breaker.stats()
+        for client in downstream.all_clients()
+        if client.breaker is not None
+    }
+
+    overall_ok = ms3_status.get("ok", False) and all(
+        breaker["state"] == "closed" for breaker in breakers.values()
+    )
     return {
         "composite": {"ok": True},
         "ms3": ms3_status,
+        "circuit_breakers": breakers,
         "status": "ok" if overall_ok else "degraded"
     }
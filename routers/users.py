@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Request, Response
 from typing import Optional
-from services import ms1
+from services import auth, ms1, tracing
 
 router = APIRouter()
 
 def _json_or_none(resp):
-    return resp.json() if resp.content else None
+    with tracing.span("decode"):
+        return resp.json() if resp.content else None
 
 
 def _extract_auth_headers(request: Request) -> dict:
@@ -44,8 +45,11 @@ async def composite_google_callback(request: Request, response: Response):
 @router.post("/auth/google/logout")
 async def composite_google_logout(request: Request, response: Response, body: dict = None):
     """Revoke Google token for the current user."""
+    claims = await auth.authenticate(request.headers.get("authorization"))
     headers = _extract_auth_headers(request)
     upstream = await ms1.google_logout(body, headers=headers)
+    if upstream.status_code < 400:
+        auth.revoke(request.headers.get("authorization"), claims)
     response.status_code = upstream.status_code
     return _json_or_none(upstream)
 
@@ -66,15 +70,23 @@ async def composite_create_user(body: dict, request: Request, response: Response
 @router.get("/users/{user_id}")
 async def composite_get_user(user_id: str, request: Request, response: Response):
     """Get user profile - requires authentication"""
+    claims = await auth.authenticate(request.headers.get("authorization"))
+    cached = auth.cached_profile(claims, user_id)
+    if cached is not None:
+        return cached
     headers = _extract_auth_headers(request)
     upstream = await ms1.get_user(user_id, headers=headers)
     response.status_code = upstream.status_code
-    return _json_or_none(upstream)
+    body = _json_or_none(upstream)
+    if upstream.status_code == 200:
+        auth.remember_profile(claims, user_id, body)
+    return body
 
 
 @router.patch("/users/{user_id}")
 async def composite_update_user(user_id: str, body: dict, request: Request, response: Response):
     """Update user profile - requires authentication"""
+    await auth.authenticate(request.headers.get("authorization"))
     headers = _extract_auth_headers(request)
     upstream = await ms1.update_user(user_id, body, headers=headers)
     response.status_code = upstream.status_code
@@ -84,6 +96,7 @@ async def composite_update_user(user_id: str, body: dict, request: Request, resp
 @router.delete("/users/{user_id}")
 async def composite_delete_user(user_id: str, request: Request, response: Response):
     """Delete (soft delete) user - requires authentication"""
+    await auth.authenticate(request.headers.get("authorization"))
     headers = _extract_auth_headers(request)
     upstream = await ms1.delete_user(user_id, headers=headers)
     response.status_code = upstream.status_code
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+
+from services.cache import TTLCache
+from services.singleflight import SingleFlight
+
+try:  # Optional dependency, only needed for RS256 tokens verified against a JWKS
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding, rsa
+except ImportError:  # pragma: no cover - depends on the environment
+    rsa = None
+
+# Local bearer token validation for the /users and logout routes. Configure
+# either a shared HS256 secret or a JWKS URL for RS256 (requires
+# ``cryptography``); with neither, tokens are forwarded to MS1 unchecked.
+JWT_SECRET = os.getenv("AUTH_JWT_SECRET", "")
+JWKS_URL = os.getenv("AUTH_JWKS_URL", "")
+ISSUER = os.getenv("AUTH_JWT_ISSUER", "")
+AUDIENCE = os.getenv("AUTH_JWT_AUDIENCE", "")
+LEEWAY = float(os.getenv("AUTH_JWT_LEEWAY", "30"))
+JWKS_CACHE_TTL = float(os.getenv("AUTH_JWKS_CACHE_TTL", "3600"))
+# Re-fetch the JWKS for an unknown ``kid`` at most this often
+JWKS_MIN_REFRESH = float(os.getenv("AUTH_JWKS_MIN_REFRESH", "30"))
+TOKEN_CACHE_TTL = float(os.getenv("AUTH_TOKEN_CACHE_TTL", "60"))
+PROFILE_CACHE_TTL = float(os.getenv("AUTH_PROFILE_CACHE_TTL", "30"))
+
+if JWT_SECRET:
+    ALGORITHM: Optional[str] = "HS256"
+elif JWKS_URL and rsa is not None:
+    ALGORITHM = "RS256"
+else:
+    ALGORITHM = None
+ENABLED = ALGORITHM is not None
+
+# sha256(token) -> claims, or an error message for rejected tokens
+_tokens = TTLCache("auth_tokens", max_entries=int(os.getenv("AUTH_TOKEN_CACHE_MAX_ENTRIES", "10000")))
+# sha256(token) -> True for tokens revoked through logout, kept until they expire
+_revoked = TTLCache("auth_revoked", max_entries=int(os.getenv("AUTH_TOKEN_CACHE_MAX_ENTRIES", "10000")))
+# (token subject, requested user id) -> MS1 profile body
+_profiles = TTLCache(
+    "user_profiles", max_entries=int(os.getenv("AUTH_PROFILE_CACHE_MAX_ENTRIES", "10000")), default_ttl=PROFILE_CACHE_TTL
+)
+# Rejections that can turn into acceptance later (nbf passing, signing key
+# rotation) and so are never cached
+_TRANSIENT_REJECTIONS = {"Token not yet valid", "Unknown token signing key"}
+_jwks: Dict[str, Any] = {"keys": {}, "fetched_at": 0.0}
+_jwks_fetches = SingleFlight()
+_rejected = 0
+
+
+def _unauthorized(message: str) -> HTTPException:
+    return HTTPException(
+        status_code=401,
+        detail={"message": message},
+        headers={"WWW-Authenticate": 'Bearer error="invalid_token"'},
+    )
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _b64int(segment: str) -> int:
+    return int.from_bytes(_b64decode(segment), "big")
+
+
+def _digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+async def _fetch_jwks() -> Dict[str, Any]:
+    async with httpx.AsyncClient(timeout=5.0) as client:
+        resp = await client.get(JWKS_URL)
+        resp.raise_for_status()
+        body = resp.json()
+    keys = {}
+    for jwk in body.get("keys", []):
+        if jwk.get("kty") == "RSA" and jwk.get("use", "sig") == "sig":
+            keys[jwk.get("kid")] = rsa.RSAPublicNumbers(_b64int(jwk["e"]), _b64int(jwk["n"])).public_key()
+    _jwks["keys"] = keys
+    _jwks["fetched_at"] = time.monotonic()
+    return keys
+
+
+async def _signing_key(kid: Optional[str]):
+    """Return the RSA public key for ``kid``, refreshing the cached JWKS when needed."""
+    age = time.monotonic() - _jwks["fetched_at"]
+    keys = _jwks["keys"]
+    if age > JWKS_CACHE_TTL or (kid not in keys and age > JWKS_MIN_REFRESH):
+        try:
+            keys = await _jwks_fetches.do("jwks", _fetch_jwks)
+        except (httpx.HTTPError, ValueError, KeyError) as exc:
+            if not keys:
+                raise HTTPException(status_code=503, detail={"message": "JWKS unavailable", "error": str(exc)})
+    return keys.get(kid)
+
+
+async def _verify(token: str) -> Dict[str, Any]:
+    """Check the signature and registered claims of ``token`` and return its claims."""
+    try:
+        header_b64, payload_b64, signature_b64 = token.split(".")
+        header = json.loads(_b64decode(header_b64))
+        claims = json.loads(_b64decode(payload_b64))
+        signature = _b64decode(signature_b64)
+    except ValueError:
+        raise _unauthorized("Malformed bearer token")
+    if not isinstance(header, dict) or not isinstance(claims, dict):
+        raise _unauthorized("Malformed bearer token")
+    # Only the configured algorithm is accepted, which rules out "none" and HS/RS confusion
+    if header.get("alg") != ALGORITHM:
+        raise _unauthorized("Unsupported token algorithm")
+
+    signing_input = f"{header_b64}.{payload_b64}".encode("ascii")
+    if ALGORITHM == "HS256":
+        expected = hmac.new(JWT_SECRET.encode("utf-8"), signing_input, hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, signature):
+            raise _unauthorized("Invalid token signature")
+    else:
+        key = await _signing_key(header.get("kid"))
+        if key is None:
+            raise _unauthorized("Unknown token signing key")
+        try:
+            key.verify(signature, signing_input, padding.PKCS1v15(), hashes.SHA256())
+        except InvalidSignature:
+            raise _unauthorized("Invalid token signature")
+
+    now = time.time()
+    try:
+        if "exp" in claims and now > float(claims["exp"]) + LEEWAY:
+            raise _unauthorized("Token expired")
+        if "nbf" in claims and now < float(claims["nbf"]) - LEEWAY:
+            raise _unauthorized("Token not yet valid")
+    except (TypeError, ValueError):
+        raise _unauthorized("Malformed token claims")
+    if ISSUER and claims.get("iss") != ISSUER:
+        raise _unauthorized("Invalid token issuer")
+    if AUDIENCE:
+        audience = claims.get("aud")
+        if AUDIENCE != audience and not (isinstance(audience, list) and AUDIENCE in audience):
+            raise _unauthorized("Invalid token audience")
+    if claims.get("sub") is None:
+        raise _unauthorized("Token has no subject")
+    return claims
+
+
+def _token(authorization: Optional[str]) -> str:
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        raise _unauthorized("Missing bearer token")
+    return token.strip()
+
+
+async def authenticate(authorization: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Validate the ``Authorization`` header locally and return the token claims.
+
+    Raises a 401 HTTPException for missing, malformed, expired, revoked or
+    badly signed tokens, without calling MS1. Results are cached per token
+    for ``AUTH_TOKEN_CACHE_TTL`` (never past the token's expiry), except
+    rejections that may clear up: not-yet-valid tokens and unknown keys. Returns None
+    when local validation is not configured.
+    """
+    global _rejected
+    if not ENABLED:
+        return None
+    try:
+        token = _token(authorization)
+        digest = _digest(token)
+        if _revoked.get(digest) is not None:
+            raise _unauthorized("Token revoked")
+        cached = _tokens.get(digest)
+        if isinstance(cached, str):
+            raise _unauthorized(cached)
+        if cached is not None:
+            return cached
+        try:
+            claims = await _verify(token)
+        except HTTPException as exc:
+            if exc.status_code == 401 and exc.detail["message"] not in _TRANSIENT_REJECTIONS:
+                _tokens.set(digest, exc.detail["message"], ttl=TOKEN_CACHE_TTL)
+            raise
+    except HTTPException as exc:
+        if exc.status_code == 401:
+            _rejected += 1
+        raise
+    ttl = TOKEN_CACHE_TTL
+    if "exp" in claims:
+        ttl = min(ttl, float(claims["exp"]) + LEEWAY - time.time())
+    _tokens.set(digest, claims, ttl=ttl)
+    return claims
+
+
+def revoke(authorization: Optional[str], claims: Optional[Dict[str, Any]]) -> None:
+    """Reject ``authorization`` from now on (after logout) and drop its subject's profiles."""
+    if claims is None:
+        return
+    digest = _digest(_token(authorization))
+    _tokens.delete(digest)
+    ttl = float(claims["exp"]) + LEEWAY - time.time() if "exp" in claims else 86400.0
+    _revoked.set(digest, True, ttl=ttl)
+    subject = str(claims["sub"])
+    _profiles.invalidate(lambda key: key[0] == subject)
+
+
+def _profile_key(claims: Dict[str, Any], user_id: Any) -> Tuple[str, str]:
+    return (str(claims["sub"]), str(user_id))
+
+
+def cached_profile(claims: Optional[Dict[str, Any]], user_id: Any) -> Optional[Any]:
+    """Return the profile MS1 last served this token subject for ``user_id``, if cached."""
+    if claims is None:
+        return None
+    return _profiles.get(_profile_key(claims, user_id))
+
+
+def remember_profile(claims: Optional[Dict[str, Any]], user_id: Any, profile: Any) -> None:
+    if claims is not None and PROFILE_CACHE_TTL > 0:
+        _profiles.set(_profile_key(claims, user_id), profile)
+
+
+def forget_profile(user_id: Any) -> None:
+    """Drop cached profiles of ``user_id`` for every subject (after PATCH/DELETE)."""
+    user_id = str(user_id)
+    _profiles.invalidate(lambda key: key[1] == user_id)
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "enabled": ENABLED,
+        "algorithm": ALGORITHM,
+        "rejected": _rejected,
+        "token_cache": _tokens.stats(),
+        "revoked": len(_revoked),
+        "profile_cache": _profiles.stats(),
+    }
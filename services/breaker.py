@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+
+class CircuitOpenError(Exception):
+    """Raised by ``CircuitBreaker.acquire`` while calls are being rejected."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit is open")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Count-based circuit breaker for one downstream.
+
+    The last ``window`` completed calls are tracked. Once at least ``min_calls``
+    are recorded, the circuit opens when the failure rate or the slow-call rate
+    reaches its threshold. While open, ``acquire`` fails fast; after
+    ``open_seconds`` it goes half-open and lets ``half_open_calls`` probes
+    through: all succeeding closes it, any failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        window: int = 20,
+        min_calls: int = 10,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 2.0,
+        slow_call_rate: float = 0.8,
+        open_seconds: float = 10.0,
+        half_open_calls: int = 3,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = self.CLOSED
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def acquire(self) -> None:
+        """Admit one call or raise CircuitOpenError; every admitted call must ``release``."""
+        if self.state == self.OPEN:
+            remaining = self._opened_at + self.open_seconds - time.monotonic()
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, remaining)
+            self._transition(self.HALF_OPEN)
+
+        if self.state == self.HALF_OPEN:
+            if self._probes_in_flight + self._probe_successes >= self.half_open_calls:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.open_seconds)
+            self._probes_in_flight += 1
+
+    def release(self, success: Optional[bool], elapsed: float) -> None:
+        """
+        Record the outcome of an admitted call. ``None`` means the call was
+        cancelled before completing and only frees its half-open probe slot.
+        """
+        if self.state == self.HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if success is None:
+                return
+            if not success:
+                self._transition(self.OPEN)
+            else:
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_calls:
+                    self._transition(self.CLOSED)
+            return
+
+        if success is None or self.state == self.OPEN:
+            return
+        self._outcomes.append((success, elapsed >= self.slow_call_seconds))
+        if len(self._outcomes) >= self.min_calls:
+            failure_rate, slow_rate = self._rates()
+            if failure_rate >= self.failure_rate or slow_rate >= self.slow_call_rate:
+                self._transition(self.OPEN)
+
+    def _rates(self) -> Tuple[float, float]:
+        total = len(self._outcomes)
+        if not total:
+            return 0.0, 0.0
+        failures = sum(1 for ok, _ in self._outcomes if not ok)
+        slow = sum(1 for _, is_slow in self._outcomes if is_slow)
+        return failures / total, slow / total
+
+    def _transition(self, state: str) -> None:
+        self.state = state
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        if state == self.OPEN:
+            self._opened_at = time.monotonic()
+            self.opened += 1
+        if state == self.CLOSED:
+            self._outcomes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        failure_rate, slow_rate = self._rates()
+        return {
+            "state": self.state,
+            "failure_rate": round(failure_rate, 4),
+            "slow_call_rate": round(slow_rate, 4),
+            "calls_in_window": len(self._outcomes),
+            "times_opened": self.opened,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Bounded in-process cache with per-entry TTLs and LRU eviction.
+
+    Entries are evicted least-recently-used first when either ``max_entries`` or
+    ``max_bytes`` would be exceeded. ``size`` is supplied by the caller (for
+    responses, the body length) so the memory cap tracks payload bytes.
+    """
+
+    def __init__(self, name: str, *, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024, default_ttl: float = 60.0):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        # key -> (expires_at, size, value)
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, _, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, *, ttl: Optional[float] = None, size: int = 1) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, size, value)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> bool:
+        if key in self._entries:
+            self._remove(key)
+            self.invalidations += 1
+            return True
+        return False
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches ``predicate``; returns the number removed."""
+        doomed = [key for key in self._entries if predicate(key)]
+        for key in doomed:
+            self._remove(key)
+        self.invalidations += len(doomed)
+        return len(doomed)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,674 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import httpx
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from compression import parse_accept_encoding
+from services import limiter, metrics, retry, tracing
+from services.breaker import CircuitBreaker, CircuitOpenError
+from services.cache import TTLCache
+from services.latency import LatencyTracker
+from services.limiter import AdaptiveLimiter, LimiterQueueFull
+from services.retry import RetryBudget, RetryPolicy
+from services.singleflight import SingleFlight
+
+
+def _env_bool(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() in {"1", "true", "yes"}
+
+
+# Requests carrying any of these headers are never served from the response cache
+_UNCACHEABLE_HEADERS = {"authorization", "if-none-match", "if-modified-since", "cache-control"}
+
+# Upstream headers preserved when a response body is streamed through unchanged
+_STREAMED_HEADERS = ("content-type", "content-encoding", "content-length", "etag", "last-modified", "cache-control")
+
+# Per-request tracing headers that must not split otherwise identical coalesced GETs
+_SINGLEFLIGHT_IGNORED_HEADERS = {"traceparent", "tracestate", "x-request-id"}
+
+
+class _UpstreamUnavailable(HTTPException):
+    """HTTPException for a transport failure; the httpx error is its ``__cause__``."""
+
+
+class DownstreamClient:
+    """
+    Pooled HTTP client for one downstream microservice.
+
+    Owns the shared ``httpx.AsyncClient``, timeouts, error mapping and per-route
+    instrumentation so the ms1/ms2/ms3 modules only declare their endpoints.
+    Routes are identified by their path template (e.g. ``/movies/{movie_id}``)
+    which keeps stats keys bounded regardless of the ids requested.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        *,
+        timeout: float = 5.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        cache: Optional[TTLCache] = None,
+        etags: Optional[TTLCache] = None,
+        coalesce: bool = True,
+        breaker: Optional[CircuitBreaker] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        hedge_percentile: Optional[float] = None,
+        hedge_max_ratio: float = 0.05,
+        hedge_min_samples: int = 50,
+        concurrency_limiter: Optional[AdaptiveLimiter] = None,
+    ):
+        self.name = name
+        self.base_url = base_url
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self.cache = cache
+        self.etags = etags
+        self.revalidated = 0
+        self.singleflight = SingleFlight() if coalesce else None
+        self.breaker = breaker
+        self.retry_policy = retry_policy
+        self._retries: Dict[Tuple[str, str], int] = {}
+        self._latency: Dict[Tuple[str, str], LatencyTracker] = {}
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        # Hedges reuse the retry token bucket: each hedgeable call earns hedge_max_ratio
+        self.hedge_budget = RetryBudget(ratio=hedge_max_ratio, min_per_second=0.0, max_tokens=10.0)
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.limiter = concurrency_limiter
+        self._client: Optional[httpx.AsyncClient] = None
+        self._route_stats: Dict[Tuple[str, str], Dict[str, float]] = {}
+        _REGISTRY[name] = self
+
+    @classmethod
+    def from_env(cls, name: str, default_base_url: str) -> "DownstreamClient":
+        """Build a client from ``<NAME>_*`` environment variables (e.g. ``MS2_TIMEOUT``)."""
+        prefix = name.upper()
+        cache = None
+        if _env_bool(f"{prefix}_CACHE_ENABLED", "true"):
+            cache = TTLCache(
+                name,
+                max_entries=int(os.getenv(f"{prefix}_CACHE_MAX_ENTRIES", "2048")),
+                max_bytes=int(os.getenv(f"{prefix}_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+            )
+        etags = None
+        if _env_bool(f"{prefix}_ETAG_CACHE_ENABLED", "true"):
+            etags = TTLCache(
+                f"{name}-etags",
+                max_entries=int(os.getenv(f"{prefix}_ETAG_CACHE_MAX_ENTRIES", "4096")),
+                max_bytes=int(os.getenv(f"{prefix}_ETAG_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+                default_ttl=float(os.getenv(f"{prefix}_ETAG_CACHE_TTL", "3600")),
+            )
+        timeout = float(os.getenv(f"{prefix}_TIMEOUT", "5.0"))
+        breaker = None
+        if _env_bool(f"{prefix}_BREAKER_ENABLED", "true"):
+            breaker = CircuitBreaker(
+                name,
+                window=int(os.getenv(f"{prefix}_BREAKER_WINDOW", "20")),
+                min_calls=int(os.getenv(f"{prefix}_BREAKER_MIN_CALLS", "10")),
+                failure_rate=float(os.getenv(f"{prefix}_BREAKER_FAILURE_RATE", "0.5")),
+                slow_call_seconds=float(os.getenv(f"{prefix}_BREAKER_SLOW_CALL_SECONDS", str(timeout * 0.8))),
+                slow_call_rate=float(os.getenv(f"{prefix}_BREAKER_SLOW_CALL_RATE", "0.8")),
+                open_seconds=float(os.getenv(f"{prefix}_BREAKER_OPEN_SECONDS", "10")),
+                half_open_calls=int(os.getenv(f"{prefix}_BREAKER_HALF_OPEN_CALLS", "3")),
+            )
+        retry_policy = None
+        if _env_bool(f"{prefix}_RETRY_ENABLED", "true"):
+            retry_policy = RetryPolicy(
+                max_attempts=int(os.getenv(f"{prefix}_RETRY_MAX_ATTEMPTS", "3")),
+                base_delay=float(os.getenv(f"{prefix}_RETRY_BASE_DELAY", "0.05")),
+                max_delay=float(os.getenv(f"{prefix}_RETRY_MAX_DELAY", "1.0")),
+                deadline=float(os.getenv(f"{prefix}_RETRY_DEADLINE", str(timeout))),
+                budget=retry.BUDGET,
+            )
+        max_connections = int(os.getenv(f"{prefix}_MAX_CONNECTIONS", "100"))
+        concurrency_limiter = None
+        if _env_bool(f"{prefix}_LIMIT_ENABLED", "true"):
+            concurrency_limiter = AdaptiveLimiter(
+                name,
+                initial_limit=int(os.getenv(f"{prefix}_LIMIT_INITIAL", "20")),
+                min_limit=int(os.getenv(f"{prefix}_LIMIT_MIN", "5")),
+                max_limit=int(os.getenv(f"{prefix}_LIMIT_MAX", str(max_connections))),
+                backoff=float(os.getenv(f"{prefix}_LIMIT_BACKOFF", "0.9")),
+                tolerance=float(os.getenv(f"{prefix}_LIMIT_LATENCY_TOLERANCE", "2.0")),
+                max_queue=int(os.getenv(f"{prefix}_LIMIT_MAX_QUEUE", "200")),
+                queue_timeout=float(os.getenv(f"{prefix}_LIMIT_QUEUE_TIMEOUT", str(timeout))),
+            )
+        return cls(
+            name,
+            os.getenv(f"{prefix}_BASE_URL", default_base_url),
+            timeout=timeout,
+            max_connections=max_connections,
+            max_keepalive_connections=int(os.getenv(f"{prefix}_MAX_KEEPALIVE_CONNECTIONS", "20")),
+            keepalive_expiry=float(os.getenv(f"{prefix}_KEEPALIVE_EXPIRY", "30.0")),
+            http2=_env_bool(f"{prefix}_HTTP2"),
+            cache=cache,
+            etags=etags,
+            coalesce=_env_bool(f"{prefix}_SINGLEFLIGHT", "true"),
+            breaker=breaker,
+            retry_policy=retry_policy,
+            hedge_percentile=(
+                float(os.getenv(f"{prefix}_HEDGE_PERCENTILE", "95")) if _env_bool(f"{prefix}_HEDGE_ENABLED") else None
+            ),
+            hedge_max_ratio=float(os.getenv(f"{prefix}_HEDGE_MAX_RATIO", "0.05")),
+            hedge_min_samples=int(os.getenv(f"{prefix}_HEDGE_MIN_SAMPLES", "50")),
+            concurrency_limiter=concurrency_limiter,
+        )
+
+    # Lifecycle -----------------------------------------------------------------
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Return the shared pooled client, creating it lazily if startup() was not called."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                follow_redirects=True,
+                http2=self.http2,
+                limits=self.limits,
+            )
+        return self._client
+
+    async def startup(self) -> None:
+        self.client
+
+    async def shutdown(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # Requests ------------------------------------------------------------------
+    async def request(
+        self,
+        method: str,
+        template: str,
+        *,
+        path_params: Optional[Dict[str, Any]] = None,
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Any] = None,
+        headers: Optional[Dict[str, str]] = None,
+        cache_ttl: Optional[float] = None,
+        revalidate: bool = False,
+        hedge: bool = False,
+    ) -> httpx.Response:
+        """
+        Perform ``method`` on the route ``template`` and raise HTTPException on errors.
+
+        GETs with a ``cache_ttl`` are served from the response cache when the
+        client has one and the request carries no conditional or auth headers.
+
+        With ``revalidate`` the client remembers the last body+ETag per path and
+        revalidates it upstream with ``If-None-Match``; a 304 returns the stored
+        200 response. Any caller ``If-None-Match`` is dropped, so callers compare
+        it against the returned ETag themselves (see ``etag_matches``).
+        """
+        path = self.build_path(template, path_params)
+        if revalidate and headers:
+            headers = {key: value for key, value in headers.items() if key.lower() != "if-none-match"}
+        key = (path, tuple(sorted((params or {}).items())))
+        cache_key = None
+        if cache_ttl and self.cache is not None and method == "GET" and self._cacheable(headers):
+            cache_key = key
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        if method == "GET":
+            async def attempt() -> httpx.Response:
+                if revalidate and self.etags is not None:
+                    return await self._revalidate(template, path, key, params=params, headers=headers)
+                return await self._send(method, template, path, params=params, headers=headers)
+
+            async def fetch() -> httpx.Response:
+                if hedge and self.hedge_percentile is not None:
+                    return await self._hedged(method, template, attempt)
+                return await attempt()
+
+            if self.singleflight is not None:
+                resp = await self.singleflight.do(self._flight_key(key, headers), fetch)
+            else:
+                resp = await fetch()
+        else:
+            resp = await self._send(method, template, path, params=params, json=json, headers=headers)
+        if cache_key is not None and resp.status_code == 200:
+            self.cache.set(cache_key, resp, ttl=cache_ttl, size=len(resp.content))
+        return resp
+
+    async def _hedged(self, method: str, template: str, attempt: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """Run ``attempt``, racing a second copy if it is slower than the hedge percentile."""
+        self.hedge_budget.deposit()
+        tracker = self._latency.get((method, template))
+        if tracker is None or len(tracker) < self.hedge_min_samples:
+            return await attempt()
+
+        primary = asyncio.ensure_future(attempt())
+        done, _ = await asyncio.wait({primary}, timeout=tracker.percentile(self.hedge_percentile))
+        if done or not self.hedge_budget.withdraw():
+            return await primary
+
+        self.hedges += 1
+        secondary = asyncio.ensure_future(attempt())
+        pending = {primary, secondary}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is secondary:
+                            self.hedge_wins += 1
+                        return task.result()
+            # Both copies failed: surface the primary's error
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            # Retrieve exceptions of cancelled/finished losers so they are never reported as unhandled
+            for task in (primary, secondary):
+                if task.done() and not task.cancelled():
+                    task.exception()
+
+    async def _revalidate(
+        self,
+        template: str,
+        path: str,
+        key: Tuple[str, Tuple[Any, ...]],
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> httpx.Response:
+        stored = self.etags.get(key)
+        send_headers = dict(headers or {})
+        if stored is not None:
+            send_headers["if-none-match"] = stored.headers["etag"]
+
+        resp = await self._send("GET", template, path, params=params, headers=send_headers)
+        if resp.status_code == 304 and stored is not None:
+            self.revalidated += 1
+            self.etags.set(key, stored, size=len(stored.content))
+            return stored
+        if resp.status_code == 200 and "etag" in resp.headers:
+            self.etags.set(key, resp, size=len(resp.content))
+        return resp
+
+    async def _send(
+        self,
+        method: str,
+        template: str,
+        path: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Any] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> httpx.Response:
+        resp = await self._call_with_retries(method, template, path, params=params, json=json, headers=headers)
+        self.raise_for_error(resp)
+        return resp
+
+    async def stream(
+        self,
+        method: str,
+        template: str,
+        *,
+        path_params: Optional[Dict[str, Any]] = None,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        accept_encoding: Optional[str] = None,
+    ) -> httpx.Response:
+        """
+        Open a streamed request whose body has not been read yet.
+
+        ``accept_encoding`` is the client's Accept-Encoding, sent upstream in
+        place of httpx's default so the raw body can be piped back as is
+        (``identity`` when the client sent none).
+
+        Error statuses are read and raised as HTTPException like ``request``.
+        On success the caller owns the response and must ``aclose()`` it; see
+        ``streaming_response`` for piping it straight to the client.
+        """
+        path = self.build_path(template, path_params)
+        headers = {**(headers or {}), "accept-encoding": accept_encoding or "identity"}
+        # Streamed latency is measured to response headers
+        resp = await self._call_with_retries(method, template, path, params=params, headers=headers, stream=True)
+        if resp.status_code >= 400:
+            try:
+                await resp.aread()
+            finally:
+                await resp.aclose()
+            self.raise_for_error(resp)
+        return resp
+
+    async def _call_with_retries(
+        self,
+        method: str,
+        template: str,
+        path: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Any] = None,
+        headers: Optional[Dict[str, str]] = None,
+        stream: bool = False,
+    ) -> httpx.Response:
+        """
+        Send ``method path``, retrying idempotent methods on connect errors and
+        502/503/504 with jittered backoff. Retries stop at the policy's attempt
+        limit, its per-request deadline, or when the shared retry budget is empty.
+        """
+        policy = self.retry_policy
+        if policy is None or method not in retry.IDEMPOTENT_METHODS:
+            request = self.client.build_request(method, path, params=params, json=json, headers=headers)
+            return await self._call(method, template, request, stream=stream)
+
+        if policy.budget is not None:
+            policy.budget.deposit()
+        deadline = time.monotonic() + policy.deadline
+        attempt = 1
+        while True:
+            remaining = deadline - time.monotonic()
+            request = self.client.build_request(
+                method, path, params=params, json=json, headers=headers, timeout=max(0.001, min(self.timeout, remaining))
+            )
+            retry_after = None
+            try:
+                resp = await self._call(method, template, request, stream=stream)
+            except _UpstreamUnavailable as exc:
+                if not isinstance(exc.__cause__, retry.RETRYABLE_ERRORS):
+                    raise
+                failure: Optional[BaseException] = exc
+            else:
+                if resp.status_code not in retry.RETRYABLE_STATUSES:
+                    return resp
+                failure = None
+                retry_after = resp.headers.get("retry-after")
+
+            delay = policy.backoff(attempt)
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            if (
+                attempt >= policy.max_attempts
+                or time.monotonic() + delay >= deadline
+                or (policy.budget is not None and not policy.budget.withdraw())
+            ):
+                if failure is not None:
+                    raise failure
+                return resp
+            if failure is None and stream:
+                await resp.aclose()
+
+            key = (method, template)
+            self._retries[key] = self._retries.get(key, 0) + 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _call(self, method: str, template: str, request: httpx.Request, *, stream: bool = False) -> httpx.Response:
+        """Send one request through the concurrency limiter and circuit breaker and record its outcome."""
+        if self.limiter is not None:
+            level = limiter.current_priority()
+            try:
+                queued = await self.limiter.acquire(level)
+            except LimiterQueueFull as exc:
+                metrics.UPSTREAM_SHED.inc((self.name, limiter.priority_name(level)))
+                raise HTTPException(
+                    status_code=503,
+                    detail={"message": f"{self.name.upper()} overloaded, shedding load"},
+                    headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+                )
+            if queued:
+                tracing.record("queue", self.name, queued)
+        if self.breaker is not None:
+            try:
+                self.breaker.acquire()
+            except CircuitOpenError as exc:
+                if self.limiter is not None:
+                    self.limiter.release(None, 0.0)
+                raise HTTPException(
+                    status_code=503,
+                    detail={"message": f"{self.name.upper()} circuit open, failing fast"},
+                    headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+                )
+
+        request.headers.update(tracing.outgoing_headers())
+        metrics.UPSTREAM_IN_FLIGHT.inc((self.name,))
+        start = time.perf_counter()
+        try:
+            resp = await self.client.send(request, stream=stream)
+        except httpx.TransportError as exc:
+            self._complete(method, template, None, time.perf_counter() - start)
+            raise self._transport_error(exc) from exc
+        except BaseException:
+            # Cancelled or failed before a response arrived: free the limiter and half-open probe slots
+            if self.limiter is not None:
+                self.limiter.release(None, 0.0)
+            if self.breaker is not None:
+                self.breaker.release(None, 0.0)
+            raise
+        finally:
+            metrics.UPSTREAM_IN_FLIGHT.dec((self.name,))
+        self._complete(method, template, resp.status_code, time.perf_counter() - start)
+        return resp
+
+    def _complete(self, method: str, template: str, status_code: Optional[int], elapsed: float) -> None:
+        self._record(method, template, status_code, elapsed)
+        tracing.record(self.name, f"{method} {template}", elapsed)
+        if status_code is not None and status_code < 500:
+            self._latency.setdefault((method, template), LatencyTracker()).record(elapsed)
+        if self.limiter is not None:
+            self.limiter.release(status_code is not None and status_code < 500, elapsed)
+        if self.breaker is not None:
+            self.breaker.release(status_code is not None and status_code < 500, elapsed)
+
+    def _transport_error(self, exc: httpx.TransportError) -> HTTPException:
+        error = str(exc) or type(exc).__name__
+        if isinstance(exc, httpx.TimeoutException):
+            return _UpstreamUnavailable(status_code=504, detail={"message": f"{self.name.upper()} timed out", "error": error})
+        return _UpstreamUnavailable(status_code=502, detail={"message": f"{self.name.upper()} unavailable", "error": error})
+
+    @staticmethod
+    def _flight_key(key: Tuple[str, Tuple[Any, ...]], headers: Optional[Dict[str, str]]) -> Tuple[Any, ...]:
+        relevant = tuple(
+            sorted(
+                (name.lower(), value)
+                for name, value in (headers or {}).items()
+                if name.lower() not in _SINGLEFLIGHT_IGNORED_HEADERS
+            )
+        )
+        # The shared call queues at its starter's priority, so callers only join same-priority flights
+        return ("GET", key, relevant, limiter.current_priority())
+
+    @staticmethod
+    def _cacheable(headers: Optional[Dict[str, str]]) -> bool:
+        return not headers or not any(key.lower() in _UNCACHEABLE_HEADERS for key in headers)
+
+    def peek(
+        self, template: str, *, path_params: Optional[Dict[str, Any]] = None, params: Optional[Dict[str, Any]] = None
+    ) -> Optional[httpx.Response]:
+        """Return a locally cached or ETag-stored GET response without calling upstream."""
+        key = (self.build_path(template, path_params), tuple(sorted((params or {}).items())))
+        for store in (self.cache, self.etags):
+            if store is not None:
+                resp = store.get(key)
+                if resp is not None:
+                    return resp
+        return None
+
+    def invalidate(self, predicate: Callable[[str], bool]) -> int:
+        """Drop cached responses and stored ETags whose request path matches ``predicate``."""
+        removed = 0
+        for store in (self.cache, self.etags):
+            if store is not None:
+                removed += store.invalidate(lambda key: predicate(key[0]))
+        return removed
+
+    @staticmethod
+    def build_path(template: str, path_params: Optional[Dict[str, Any]] = None) -> str:
+        if not path_params:
+            return template
+        return template.format(**{key: quote(str(value), safe="") for key, value in path_params.items()})
+
+    @staticmethod
+    def raise_for_error(resp: httpx.Response) -> None:
+        if resp.status_code >= 400:
+            try:
+                detail = resp.json()
+            except ValueError:
+                detail = resp.text
+            raise HTTPException(status_code=resp.status_code, detail=detail)
+
+    # Instrumentation -----------------------------------------------------------
+    def _record(self, method: str, template: str, status_code: Optional[int], elapsed: float) -> None:
+        metrics.UPSTREAM_LATENCY.observe((self.name, method, template), elapsed)
+        metrics.UPSTREAM_REQUESTS.inc(
+            (self.name, method, template, str(status_code) if status_code is not None else "error")
+        )
+        stats = self._route_stats.setdefault(
+            (method, template), {"requests": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+        )
+        stats["requests"] += 1
+        if status_code is None or status_code >= 500:
+            stats["errors"] += 1
+        stats["total_seconds"] += elapsed
+        stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+    def pool_stats(self) -> Dict[str, int]:
+        """Active/idle connection counts of the underlying pool (zero before first use)."""
+        active = idle = 0
+        # httpx does not expose its pool publicly; tolerate transports without one
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        for connection in getattr(pool, "connections", ()):
+            if connection.is_idle():
+                idle += 1
+            else:
+                active += 1
+        return {"active": active, "idle": idle, "max": self.limits.max_connections}
+
+    def stats(self) -> Dict[str, Any]:
+        routes = {}
+        for (method, template), stats in self._route_stats.items():
+            count = stats["requests"]
+            routes[f"{method} {template}"] = {
+                "requests": count,
+                "errors": stats["errors"],
+                "avg_ms": round(stats["total_seconds"] / count * 1000, 3) if count else 0.0,
+                "max_ms": round(stats["max_seconds"] * 1000, 3),
+            }
+        for (method, template), count in self._retries.items():
+            routes.setdefault(f"{method} {template}", {})["retries"] = count
+        stats: Dict[str, Any] = {"base_url": self.base_url, "routes": routes, "pool": self.pool_stats()}
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        if self.hedge_percentile is not None:
+            stats["hedging"] = {
+                "percentile": self.hedge_percentile,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "budget_exhausted": self.hedge_budget.exhausted,
+            }
+        if self.breaker is not None:
+            stats["circuit_breaker"] = self.breaker.stats()
+        if self.limiter is not None:
+            stats["concurrency_limiter"] = self.limiter.stats()
+        if self.singleflight is not None:
+            stats["singleflight"] = self.singleflight.stats()
+        if self.etags is not None:
+            stats["etags"] = {**self.etags.stats(), "revalidated_304": self.revalidated}
+        return stats
+
+
+_REGISTRY: Dict[str, DownstreamClient] = {}
+
+
+def all_clients() -> List[DownstreamClient]:
+    return list(_REGISTRY.values())
+
+
+def _collect_client_metrics() -> None:
+    for client in all_clients():
+        pool = client.pool_stats()
+        metrics.UPSTREAM_POOL_CONNECTIONS.set((client.name, "active"), pool["active"])
+        metrics.UPSTREAM_POOL_CONNECTIONS.set((client.name, "idle"), pool["idle"])
+        metrics.UPSTREAM_POOL_MAX_CONNECTIONS.set((client.name,), pool["max"])
+        if client.limiter is not None:
+            metrics.UPSTREAM_CONCURRENCY_LIMIT.set((client.name,), client.limiter.limit)
+            metrics.UPSTREAM_QUEUED.set((client.name,), client.limiter.stats()["queued"])
+
+
+metrics.register_collector(_collect_client_metrics)
+
+
+async def startup_all() -> None:
+    for client in all_clients():
+        await client.startup()
+
+
+async def shutdown_all() -> None:
+    for client in all_clients():
+        await client.shutdown()
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """Weak comparison of an ``If-None-Match`` header value against ``etag``."""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    def _opaque(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+
+    return _opaque(etag) in {_opaque(candidate) for candidate in if_none_match.split(",")}
+
+
+def _accepts_encodings(accept_encoding: Optional[str], content_encoding: str) -> bool:
+    """Whether every coding in ``content_encoding`` is acceptable under ``accept_encoding``."""
+    accepted = parse_accept_encoding(accept_encoding or "")
+    for coding in content_encoding.split(","):
+        coding = coding.strip().lower()
+        if coding and coding != "identity" and accepted.get(coding, accepted.get("*", 0)) <= 0:
+            return False
+    return True
+
+
+def streaming_response(resp: httpx.Response, accept_encoding: Optional[str] = None) -> StreamingResponse:
+    """
+    Pipe an open upstream response to the client without decoding it, closing it when done.
+
+    A body whose Content-Encoding the client did not accept (``accept_encoding``
+    is its Accept-Encoding header) is decoded on the way through instead.
+    """
+    headers = {name: resp.headers[name] for name in _STREAMED_HEADERS if name in resp.headers}
+    chunks = resp.aiter_raw
+    if "content-encoding" in headers:
+        headers["vary"] = "Accept-Encoding"
+        if not _accepts_encodings(accept_encoding, headers["content-encoding"]):
+            chunks = resp.aiter_bytes
+            del headers["content-encoding"]
+            headers.pop("content-length", None)
+
+    async def body():
+        try:
+            async for chunk in chunks():
+                yield chunk
+        finally:
+            await resp.aclose()
+
+    return StreamingResponse(
+        body(), status_code=resp.status_code, headers=headers, background=BackgroundTask(resp.aclose)
+    )
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, Optional
+
+from services.cache import TTLCache
+
+# Short-lived positive/negative cache of "does this entity exist downstream?"
+# answers, used by foreign key validation. Negative answers expire sooner so a
+# freshly created movie or user becomes valid quickly.
+POSITIVE_TTL = float(os.getenv("EXISTENCE_CACHE_POSITIVE_TTL", "60"))
+NEGATIVE_TTL = float(os.getenv("EXISTENCE_CACHE_NEGATIVE_TTL", "10"))
+
+_cache = TTLCache(
+    "existence",
+    max_entries=int(os.getenv("EXISTENCE_CACHE_MAX_ENTRIES", "50000")),
+)
+
+
+def lookup(kind: str, entity_id: Any) -> Optional[bool]:
+    """Return the cached existence of ``kind``/``entity_id`` or None if unknown."""
+    return _cache.get((kind, str(entity_id)))
+
+
+def remember(kind: str, entity_id: Any, exists: bool) -> None:
+    _cache.set((kind, str(entity_id)), exists, ttl=POSITIVE_TTL if exists else NEGATIVE_TTL)
+
+
+def forget(kind: str, entity_id: Any) -> None:
+    _cache.delete((kind, str(entity_id)))
+
+
+def stats() -> Dict[str, Any]:
+    return _cache.stats()
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Iterable, List
+
+
+def _bounded(aws: Iterable[Awaitable[Any]], limit: int) -> List[Awaitable[Any]]:
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(aw: Awaitable[Any]) -> Any:
+        async with semaphore:
+            return await aw
+
+    return [run(aw) for aw in aws]
+
+
+async def gather_bounded(aws: Iterable[Awaitable[Any]], limit: int) -> List[Any]:
+    """Like ``asyncio.gather(..., return_exceptions=True)`` with at most ``limit`` running at once."""
+    return await asyncio.gather(*_bounded(aws, limit), return_exceptions=True)
+
+
+def start_bounded(aws: Iterable[Awaitable[Any]], limit: int) -> List["asyncio.Future[Any]"]:
+    """Schedule ``aws`` as tasks of which at most ``limit`` run at once; pair with ``cancel_all``."""
+    return [asyncio.ensure_future(aw) for aw in _bounded(aws, limit)]
+
+
+async def cancel_all(tasks: Iterable["asyncio.Future[Any]"]) -> None:
+    """Cancel unfinished ``tasks`` and wait for them, discarding their results and errors."""
+    tasks = list(tasks)
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional
+
+from fastapi import HTTPException
+
+
+class _Watch:
+    def __init__(self) -> None:
+        self.status: Optional[Any] = None
+        self.error: Optional[HTTPException] = None
+        self.version = 0
+        self.done = False
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+        self.task: Optional["asyncio.Task[None]"] = None
+
+    def publish(self, status: Optional[Any] = None, error: Optional[HTTPException] = None, done: bool = False) -> None:
+        if error is None:
+            self.status = status
+        self.error = error
+        self.done = done
+        self.version += 1
+        # Wake everyone waiting on the old event; later waiters get a fresh one
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class JobWatcher:
+    """
+    Share one upstream poller per job between any number of waiting clients.
+
+    The first subscriber for a key starts a poller that calls ``fetch(key)``
+    with exponential backoff (``initial_delay`` growing by ``multiplier`` up to
+    ``max_delay``) and publishes each status that differs from the previous
+    one. Polling stops when ``is_final(status)`` holds, after ``max_duration``
+    seconds, after ``max_errors`` consecutive 5xx/transport failures, on a
+    4xx, or once no subscribers remain. Final results are kept for ``linger``
+    seconds so late subscribers get them without another upstream call.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[Hashable], Awaitable[Any]],
+        is_final: Callable[[Any], bool],
+        *,
+        initial_delay: float = 0.25,
+        max_delay: float = 2.0,
+        multiplier: float = 1.5,
+        max_duration: float = 300.0,
+        max_errors: int = 5,
+        linger: float = 30.0,
+    ):
+        self.fetch = fetch
+        self.is_final = is_final
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.max_duration = max_duration
+        self.max_errors = max_errors
+        self.linger = linger
+        self._watches: Dict[Hashable, _Watch] = {}
+        self.polls = 0
+        self.deliveries = 0
+
+    async def watch(self, key: Hashable) -> AsyncIterator[Any]:
+        """
+        Yield the job's current status and then each change, ending after the
+        final status. A failed job raises its HTTPException.
+        """
+        watch = self._watches.get(key)
+        if watch is None:
+            watch = self._watches[key] = _Watch()
+        watch.subscribers += 1
+        if watch.task is None and not watch.done:
+            watch.task = asyncio.ensure_future(self._poll(key, watch))
+        seen = 0
+        try:
+            while True:
+                changed = watch.changed
+                if watch.version > seen:
+                    seen = watch.version
+                    if watch.error is not None:
+                        raise watch.error
+                    self.deliveries += 1
+                    yield watch.status
+                    if watch.done:
+                        return
+                    continue
+                await changed.wait()
+        finally:
+            watch.subscribers -= 1
+
+    async def wait(self, key: Hashable, timeout: float) -> Optional[Any]:
+        """Return the final status, or the latest one seen if ``timeout`` passes first."""
+        latest = None
+
+        async def consume() -> None:
+            nonlocal latest
+            async for status in self.watch(key):
+                latest = status
+
+        try:
+            await asyncio.wait_for(consume(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return latest
+
+    async def _poll(self, key: Hashable, watch: _Watch) -> None:
+        delay = self.initial_delay
+        deadline = time.monotonic() + self.max_duration
+        errors = 0
+        try:
+            while watch.subscribers > 0:
+                self.polls += 1
+                try:
+                    status = await self.fetch(key)
+                except HTTPException as exc:
+                    errors += 1
+                    if exc.status_code < 500 or errors >= self.max_errors:
+                        watch.publish(error=exc, done=True)
+                        return
+                else:
+                    errors = 0
+                    final = self.is_final(status)
+                    if final or watch.version == 0 or status != watch.status:
+                        watch.publish(status, done=final)
+                    if final:
+                        return
+                if time.monotonic() + delay > deadline:
+                    watch.publish(
+                        error=HTTPException(status_code=504, detail={"message": "Job did not finish in time"}),
+                        done=True,
+                    )
+                    return
+                await asyncio.sleep(delay)
+                delay = min(self.max_delay, delay * self.multiplier)
+        except BaseException as exc:
+            if not watch.done:
+                watch.publish(error=HTTPException(status_code=502, detail={"message": str(exc)}), done=True)
+            if not isinstance(exc, Exception):
+                raise
+        finally:
+            watch.task = None
+            if watch.done:
+                asyncio.get_running_loop().call_later(self.linger, self._expire, key, watch)
+            else:
+                # Every subscriber left before the job finished
+                self._expire(key, watch)
+
+    def _expire(self, key: Hashable, watch: _Watch) -> None:
+        if self._watches.get(key) is watch:
+            del self._watches[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "jobs_polling": sum(1 for watch in self._watches.values() if watch.task is not None),
+            "jobs_finished": sum(1 for watch in self._watches.values() if watch.done),
+            "subscribers": sum(watch.subscribers for watch in self._watches.values()),
+            "upstream_polls": self.polls,
+            "deliveries": self.deliveries,
+        }
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Deque, Optional
+
+
+class LatencyTracker:
+    """Rolling window of the most recent call latencies (seconds) for one endpoint."""
+
+    def __init__(self, size: int = 256):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Return the ``pct`` (0-100) percentile of the window, or None if it is empty."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+        return ordered[index]
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from services.latency import LatencyTracker
+
+# Request priorities; lower values are admitted first and shed last
+HIGH = 0
+NORMAL = 1
+LOW = 2
+_PRIORITY_NAMES = {HIGH: "high", NORMAL: "normal", LOW: "low"}
+
+_priority: ContextVar[int] = ContextVar("request_priority", default=NORMAL)
+
+
+def priority_name(level: int) -> str:
+    return _PRIORITY_NAMES.get(level, str(level))
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+def set_priority(level: int) -> None:
+    """Set the priority of downstream calls made by the current request."""
+    _priority.set(level)
+
+
+@contextmanager
+def priority(level: int) -> Iterator[None]:
+    """Run downstream calls made inside the block at ``level``."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class LimiterQueueFull(Exception):
+    """Raised by ``AdaptiveLimiter.acquire`` when a call is shed instead of queued."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} concurrency limit reached")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for one downstream.
+
+    Each call that completes within ``tolerance`` times the baseline latency
+    (the 10th percentile of recent successful calls) raises the limit by
+    ``1/limit``, i.e. roughly +1 per window of ``limit`` calls. A failure (5xx,
+    connection error, timeout) or a slower call multiplies it by ``backoff``,
+    at most once per observed round-trip. Calls beyond the limit wait in a
+    priority queue of at most ``max_queue`` entries for up to ``queue_timeout``
+    seconds. When the queue is full, a lower-priority waiter is evicted to make
+    room, or the new call is rejected with LimiterQueueFull.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        initial_limit: int = 20,
+        min_limit: int = 5,
+        max_limit: int = 100,
+        backoff: float = 0.9,
+        tolerance: float = 2.0,
+        max_queue: int = 200,
+        queue_timeout: float = 5.0,
+        min_samples: int = 20,
+    ):
+        self.name = name
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.min_samples = min_samples
+        self.in_flight = 0
+        self._latency = LatencyTracker(size=200)
+        self._next_decrease = 0.0
+        # (priority, sequence, future) of waiting calls; granted/abandoned futures are skipped
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._waiting = 0
+        self._sequence = itertools.count()
+        self.shed: Dict[str, int] = {name: 0 for name in _PRIORITY_NAMES.values()}
+        self.increases = 0
+        self.decreases = 0
+
+    async def acquire(self, level: int = NORMAL) -> float:
+        """Admit one call, waiting if needed; returns seconds spent queued. Every admitted call must ``release``."""
+        if self.in_flight < int(self.limit) and not self._waiting:
+            self.in_flight += 1
+            return 0.0
+        if self._waiting >= self.max_queue and not self._evict(level):
+            self._reject(level)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (level, next(self._sequence), future))
+        self._waiting += 1
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._abandon(future)
+            self._reject(level)
+        except BaseException:
+            self._abandon(future)
+            raise
+        return time.monotonic() - start
+
+    def release(self, success: Optional[bool], elapsed: float) -> None:
+        """
+        Free the slot of an admitted call and adapt the limit. ``None`` means the
+        call was cancelled or rejected before completing and only frees its slot.
+        """
+        self.in_flight = max(0, self.in_flight - 1)
+        if success is not None:
+            self._adapt(success, elapsed)
+        self._grant()
+
+    def _adapt(self, success: bool, elapsed: float) -> None:
+        baseline = self._latency.percentile(10) if len(self._latency) >= self.min_samples else None
+        if success:
+            self._latency.record(elapsed)
+        overloaded = not success or (baseline is not None and elapsed > baseline * self.tolerance)
+        now = time.monotonic()
+        if overloaded:
+            if now >= self._next_decrease:
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self.decreases += 1
+                # Calls already in flight saw the same overload; decrease once per round-trip
+                self._next_decrease = now + elapsed
+        elif self.limit < self.max_limit:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            self.increases += 1
+
+    def _grant(self) -> None:
+        while self._queue and self.in_flight < int(self.limit):
+            _, _, future = heapq.heappop(self._queue)
+            if future.done():
+                continue
+            self._waiting -= 1
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _abandon(self, future: asyncio.Future) -> None:
+        if future.done() and not future.cancelled() and future.exception() is None:
+            # Granted just as the waiter gave up: hand the slot to the next waiter
+            self.release(None, 0.0)
+        elif not future.done():
+            future.cancel()
+            self._waiting -= 1
+
+    def _evict(self, level: int) -> bool:
+        """Reject the newest waiter with a lower priority than ``level`` to make room."""
+        victim = None
+        for entry in self._queue:
+            if entry[0] > level and not entry[2].done() and (victim is None or entry[:2] > victim[:2]):
+                victim = entry
+        if victim is None:
+            return False
+        self._waiting -= 1
+        self._count_shed(victim[0])
+        victim[2].set_exception(LimiterQueueFull(self.name, self.retry_after()))
+        return True
+
+    def _count_shed(self, level: int) -> None:
+        key = priority_name(level)
+        self.shed[key] = self.shed.get(key, 0) + 1
+
+    def _reject(self, level: int) -> None:
+        self._count_shed(level)
+        raise LimiterQueueFull(self.name, self.retry_after())
+
+    def retry_after(self) -> float:
+        """Rough time for the current queue to drain at the current limit."""
+        typical = self._latency.percentile(50) or 1.0
+        return typical * (self._waiting / max(1.0, self.limit) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        baseline = self._latency.percentile(10)
+        return {
+            "limit": round(self.limit, 2),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "queued": self._waiting,
+            "max_queue": self.max_queue,
+            "baseline_ms": round(baseline * 1000, 3) if baseline is not None else None,
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "shed": dict(self.shed),
+        }
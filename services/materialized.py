@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set
+
+from fastapi import HTTPException
+
+from services.fanout import gather_bounded
+
+# Observed writes: the ms2/ms3 service functions report which movie a write
+# touched, and consumers (movie-details caches) subscribe here.
+_movie_listeners: List[Callable[[int], None]] = []
+
+
+def on_movie_changed(listener: Callable[[int], None]) -> None:
+    _movie_listeners.append(listener)
+
+
+def movie_changed(movie_id: Any) -> None:
+    """Notify subscribers that a write through the composite touched ``movie_id``."""
+    try:
+        movie_id = int(movie_id)
+    except (TypeError, ValueError):
+        return
+    for listener in _movie_listeners:
+        listener(movie_id)
+
+
+class MaterializedStore:
+    """
+    Precomputed documents for a fixed set of hot keys.
+
+    ``warm`` builds every tracked key; afterwards a key is rebuilt when
+    ``changed`` is called for it (an observed write). From that call until a
+    rebuild succeeds, ``get`` returns None so callers fall back to fetching.
+    Rebuilds run in the background, one at a time per key: changes arriving
+    mid-rebuild trigger exactly one more rebuild. A 404 drops the document
+    (the entity was deleted); other failures leave the key unavailable.
+
+    With ``max_age``, ``get`` also stops returning documents built longer ago
+    than that, which bounds staleness from writes this process never sees.
+    Keys ``get`` skips are rebuilt again at most once per ``max_age``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        build: Callable[[Hashable], Awaitable[Any]],
+        *,
+        warm_concurrency: int = 4,
+        max_age: Optional[float] = None,
+    ):
+        self.name = name
+        self.build = build
+        self.warm_concurrency = warm_concurrency
+        self.max_age = max_age
+        self.keys: Set[Hashable] = set()
+        self._documents: Dict[Hashable, Dict[str, Any]] = {}
+        self._tasks: Dict[Hashable, "asyncio.Task[None]"] = {}
+        self._dirty: Set[Hashable] = set()
+        # Keys with an observed write not yet reflected in their document
+        self._stale: Set[Hashable] = set()
+        self._warming: Optional["asyncio.Task[Any]"] = None
+        self._retry_at: Dict[Hashable, float] = {}
+        self.refreshes = 0
+        self.failures = 0
+        self.expired = 0
+
+    def track(self, keys: Iterable[Hashable]) -> None:
+        self.keys.update(keys)
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """Return ``{"payload", "built_at"}`` for a materialized key, or None if absent, changed or expired."""
+        document = self._documents.get(key)
+        if document is None:
+            return None
+        stale = key in self._stale
+        if not stale and (self.max_age is None or time.monotonic() - document["built_at"] <= self.max_age):
+            return document
+        if not stale:
+            self.expired += 1
+        now = time.monotonic()
+        if self.max_age is not None and key not in self._tasks and now >= self._retry_at.get(key, 0.0):
+            self._retry_at[key] = now + self.max_age
+            self._schedule(key)
+        return None
+
+    def previous(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """The last document built for ``key``, even if expired, unless a write has invalidated it."""
+        return None if key in self._stale else self._documents.get(key)
+
+    def changed(self, key: Hashable) -> None:
+        """Stop serving ``key`` (it was written) and rebuild it in the background."""
+        if key not in self.keys:
+            return
+        self._stale.add(key)
+        self._schedule(key)
+
+    def _schedule(self, key: Hashable) -> None:
+        if key in self._tasks:
+            self._dirty.add(key)
+            return
+        task = asyncio.ensure_future(self._run(key))
+        self._tasks[key] = task
+
+    async def warm(self) -> None:
+        await gather_bounded((self._warm_one(key) for key in list(self.keys)), self.warm_concurrency)
+
+    async def _warm_one(self, key: Hashable) -> None:
+        # Shares the per-key task, so a write during warm-up still gets its own rebuild
+        self._schedule(key)
+        task = self._tasks.get(key)
+        if task is not None:
+            await task
+
+    def start(self) -> None:
+        """Warm all tracked keys in the background so startup is not blocked on the upstreams."""
+        if self.keys and self._warming is None:
+            self._warming = asyncio.ensure_future(self.warm())
+
+    async def stop(self) -> None:
+        tasks = [task for task in (self._warming, *self._tasks.values()) if task is not None]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._warming = None
+
+    async def _run(self, key: Hashable) -> None:
+        try:
+            while True:
+                self._dirty.discard(key)
+                await self._refresh(key)
+                if key not in self._dirty:
+                    return
+        finally:
+            self._tasks.pop(key, None)
+
+    async def _refresh(self, key: Hashable) -> None:
+        self.refreshes += 1
+        try:
+            payload = await self.build(key)
+        except HTTPException as exc:
+            self.failures += 1
+            if exc.status_code == 404:
+                self._documents.pop(key, None)
+                self._stale.discard(key)
+            return
+        except Exception:
+            self.failures += 1
+            return
+        if payload is not None:
+            self._documents[key] = {"payload": payload, "built_at": time.monotonic()}
+            # A write during this build already queued another rebuild; keep the key stale until then
+            if key not in self._dirty:
+                self._stale.discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tracked": len(self.keys),
+            "materialized": len(self._documents),
+            "refreshing": len(self._tasks),
+            "stale": len(self._stale),
+            "warming": self._warming is not None and not self._warming.done(),
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "expired": self.expired,
+        }
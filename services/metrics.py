@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import bisect
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; covers cache-speed local hits up to the slowest upstream timeouts
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        _METRICS.append(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: Tuple[str, ...] = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+    def set(self, labels: Tuple[str, ...], value: float) -> None:
+        self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> ([count per bucket, ..., +Inf], sum)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = entry
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total[0])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+_METRICS: List[_Metric] = []
+# Called before rendering to refresh gauges sampled from live objects (e.g. pools)
+_COLLECTORS: List[Callable[[], None]] = []
+
+
+def register_collector(collect: Callable[[], None]) -> None:
+    _COLLECTORS.append(collect)
+
+
+def render() -> str:
+    """Return all metrics in the Prometheus text exposition format."""
+    for collect in _COLLECTORS:
+        collect()
+    lines: List[str] = []
+    for metric in _METRICS:
+        lines.extend(metric.header())
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+# Downstream calls: labelled by path template, never by the concrete path
+UPSTREAM_LATENCY = Histogram(
+    "composite_upstream_request_duration_seconds",
+    "Latency of calls to downstream services.",
+    ("downstream", "method", "route"),
+)
+UPSTREAM_REQUESTS = Counter(
+    "composite_upstream_requests_total",
+    "Calls to downstream services by response status ('error' for transport failures).",
+    ("downstream", "method", "route", "status"),
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "composite_upstream_in_flight_requests",
+    "Downstream calls currently awaiting a response.",
+    ("downstream",),
+)
+UPSTREAM_POOL_CONNECTIONS = Gauge(
+    "composite_upstream_pool_connections",
+    "Pooled connections to each downstream by state.",
+    ("downstream", "state"),
+)
+UPSTREAM_POOL_MAX_CONNECTIONS = Gauge(
+    "composite_upstream_pool_max_connections",
+    "Configured connection limit for each downstream pool.",
+    ("downstream",),
+)
+UPSTREAM_CONCURRENCY_LIMIT = Gauge(
+    "composite_upstream_concurrency_limit",
+    "Current adaptive concurrency limit for each downstream.",
+    ("downstream",),
+)
+UPSTREAM_QUEUED = Gauge(
+    "composite_upstream_queued_requests",
+    "Downstream calls waiting for a concurrency slot.",
+    ("downstream",),
+)
+UPSTREAM_SHED = Counter(
+    "composite_upstream_shed_total",
+    "Downstream calls rejected with 503 because the wait queue was full or timed out.",
+    ("downstream", "priority"),
+)
+
+# Composite routes: labelled by the matched route path (e.g. /composite/movies/{movie_id})
+HTTP_LATENCY = Histogram(
+    "composite_http_request_duration_seconds",
+    "Latency of composite API requests.",
+    ("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = Gauge(
+    "composite_http_in_flight_requests",
+    "Composite API requests currently being served.",
+)
+
+
+class RouteMetricsMiddleware:
+    """ASGI middleware recording per-route latency and status for the composite API."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status: Optional[int] = None
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            HTTP_LATENCY.observe(
+                (scope["method"], route_template(scope), str(status) if status is not None else "error"),
+                time.perf_counter() - start,
+            )
+
+
+def route_template(scope) -> str:
+    """
+    Return the matched route's path template, e.g. ``/composite/movies/{movie_id}``.
+
+    Some FastAPI versions leave ``include_router`` prefixes out of the route's
+    path; the missing leading segments are taken from the request path. Unmatched
+    paths collapse into one label so random URLs cannot grow the series count.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path_format", None) or getattr(route, "path", None)
+    if not template:
+        return "<unmatched>"
+    segments = scope["path"].strip("/").split("/")
+    template_segments = template.strip("/").split("/")
+    return "/" + "/".join(segments[: max(0, len(segments) - len(template_segments))] + template_segments)
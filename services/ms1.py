@@ -3,93 +3,119 @@ from __future__ import annotations
 import os
 from typing import Any, Dict, Optional
 
-import httpx
 from fastapi import HTTPException
 
-# Base URL for MicroService1 (override via env, e.g., http://localhost:8080)
-MS1_BASE_URL = os.getenv("MS1_BASE_URL", "https://microservice1-608197196549.us-central1.run.app")
-TIMEOUT = float(os.getenv("MS1_TIMEOUT", "5.0"))
-
-
-async def _request(
-    method: str,
-    path: str,
-    *,
-    params: Optional[Dict[str, Any]] = None,
-    json: Optional[Dict[str, Any]] = None,
-    headers: Optional[Dict[str, str]] = None,
-):
-    """Perform an HTTP request to MicroService1."""
-    async with httpx.AsyncClient(
-        base_url=MS1_BASE_URL,
-        timeout=TIMEOUT,
-        follow_redirects=True,
-    ) as client:
-        resp = await client.request(
-            method,
-            path,
-            params=params,
-            json=json,
-            headers=headers,
-        )
-    _raise_for_error(resp)
-    return resp
-
+from services import auth, existence
+from services.cache import TTLCache
+from services.downstream import DownstreamClient
 
-def _raise_for_error(resp: httpx.Response) -> None:
-    if resp.status_code >= 400:
-        try:
-            detail = resp.json()
-        except ValueError:
-            detail = resp.text
-        raise HTTPException(status_code=resp.status_code, detail=detail)
+# Base URL for MicroService1 (override via env, e.g., http://localhost:8080)
+client = DownstreamClient.from_env("ms1", "https://microservice1-608197196549.us-central1.run.app")
+MS1_BASE_URL = client.base_url
+
+# Profile fields that may be shown to anyone (e.g. reviewers embedded by
+# movie-details expand=reviews.user); the full profile stays behind the
+# authenticated /users routes.
+PUBLIC_USER_FIELDS = tuple(
+    field.strip() for field in os.getenv("EXPAND_USER_PUBLIC_FIELDS", "id,name,username").split(",") if field.strip()
+)
+_public_users = TTLCache(
+    "public-users",
+    max_entries=int(os.getenv("EXPAND_USER_CACHE_MAX_ENTRIES", "5000")),
+    default_ttl=float(os.getenv("EXPAND_USER_CACHE_TTL", "60")),
+)
 
 
 # User endpoints --------------------------------------------------------------
 async def create_user(body: Dict[str, Any]):
-    return await _request("POST", "/users", json=body)
+    return await client.request("POST", "/users", json=body)
 
 
 async def login(body: Dict[str, Any]):
     """Login endpoint - POST /sessions"""
-    return await _request("POST", "/sessions", json=body)
+    return await client.request("POST", "/sessions", json=body)
 
 
 async def google_auth_url():
     """Get Google OAuth authorization URL and state."""
-    return await _request("GET", "/auth/google/url")
+    return await client.request("GET", "/auth/google/url")
 
 
 async def google_callback(params: Dict[str, Any]):
     """Handle Google OAuth callback by forwarding query params."""
-    return await _request("GET", "/auth/google/callback", params=params)
+    return await client.request("GET", "/auth/google/callback", params=params)
 
 
 async def google_logout(body: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None):
     """Revoke Google token for the current user (requires Authorization header)."""
-    return await _request("POST", "/auth/google/logout", json=body, headers=headers)
+    return await client.request("POST", "/auth/google/logout", json=body, headers=headers)
 
 
 async def get_user(user_id: str, headers: Optional[Dict[str, str]] = None):
-    return await _request("GET", f"/users/{user_id}", headers=headers)
+    return await client.request("GET", "/users/{user_id}", path_params={"user_id": user_id}, headers=headers)
+
+
+async def get_public_user(user_id: Any) -> Optional[Dict[str, Any]]:
+    """
+    Return only the PUBLIC_USER_FIELDS of a user, cached briefly.
+
+    MS1 is called without the caller's credentials; if it insists on them the
+    user is reduced to ``{"id": user_id}`` rather than dropped.
+    """
+    key = str(user_id)
+    cached = _public_users.get(key)
+    if cached is not None:
+        return cached
+    try:
+        resp = await get_user(key)
+    except HTTPException as e:
+        if e.status_code not in (401, 403):
+            raise
+        user: Any = {"id": user_id}
+    else:
+        user = resp.json() if resp.content else None
+    if not isinstance(user, dict):
+        return None
+    public = {field: user[field] for field in PUBLIC_USER_FIELDS if field in user}
+    _public_users.set(key, public)
+    return public
+
+
+def forget_public_user(user_id: Any) -> None:
+    _public_users.delete(str(user_id))
 
 
 async def update_user(user_id: str, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
-    return await _request("PATCH", f"/users/{user_id}", json=body, headers=headers)
+    try:
+        return await client.request(
+            "PATCH", "/users/{user_id}", path_params={"user_id": user_id}, json=body, headers=headers
+        )
+    finally:
+        auth.forget_profile(user_id)
+        forget_public_user(user_id)
 
 
 async def delete_user(user_id: str, headers: Optional[Dict[str, str]] = None):
-    return await _request("DELETE", f"/users/{user_id}", headers=headers)
+    try:
+        return await client.request("DELETE", "/users/{user_id}", path_params={"user_id": user_id}, headers=headers)
+    finally:
+        existence.forget("user", user_id)
+        auth.forget_profile(user_id)
+        forget_public_user(user_id)
 
 
 # Note: Status endpoints are not implemented in MS1, keeping for backward compatibility
 # but they will return 404 from MS1
 async def get_user_status(user_id: str, headers: Optional[Dict[str, str]] = None):
-    return await _request("GET", f"/users/{user_id}/status", headers=headers)
+    return await client.request(
+        "GET", "/users/{user_id}/status", path_params={"user_id": user_id}, headers=headers
+    )
 
 
 async def update_user_status(user_id: str, status: Any, locked_until: Optional[str] = None, headers: Optional[Dict[str, str]] = None):
     params = {"status": status}
     if locked_until is not None:
         params["locked_until"] = locked_until
-    return await _request("PATCH", f"/users/{user_id}/status", params=params, headers=headers)
+    return await client.request(
+        "PATCH", "/users/{user_id}/status", path_params={"user_id": user_id}, params=params, headers=headers
+    )
@@ -1,105 +1,174 @@
 from __future__ import annotations
 
 import os
-from typing import Any, Dict, Optional
+import re
+from typing import Any, Dict, Optional, Tuple
 
-import httpx
-from fastapi import HTTPException
+from services import existence, limiter, materialized
+from services.downstream import DownstreamClient
+from services.jobwatch import JobWatcher
 
 # Base URL for MicroService2 (override via env, e.g., http://localhost:8000)
 # Default to Cloud Run deployment URL
-MS2_BASE_URL = os.getenv("MS2_BASE_URL", "https://microservice2-608197196549.us-central1.run.app")
-TIMEOUT = float(os.getenv("MS2_TIMEOUT", "5.0"))
-
-
-async def _request(
-    method: str,
-    path: str,
-    *,
-    params: Optional[Dict[str, Any]] = None,
-    json: Optional[Dict[str, Any]] = None,
-    headers: Optional[Dict[str, str]] = None,
-):
-    """Perform an HTTP request to MicroService2."""
-    async with httpx.AsyncClient(
-        base_url=MS2_BASE_URL,
-        timeout=TIMEOUT,
-        follow_redirects=True,
-    ) as client:
-        resp = await client.request(
-            method,
-            path,
-            params=params,
-            json=json,
-            headers=headers,
-        )
-    _raise_for_error(resp)
-    return resp
+client = DownstreamClient.from_env("ms2", "https://microservice2-608197196549.us-central1.run.app")
+MS2_BASE_URL = client.base_url
+
+# Pipe list responses straight through instead of decoding and re-encoding them
+STREAM_LISTS = os.getenv("MS2_STREAM_LISTS", "true").lower() in {"1", "true", "yes"}
+
+# Response cache TTLs (seconds) for the read-heavy catalog routes; 0 disables
+MOVIE_CACHE_TTL = float(os.getenv("MS2_CACHE_TTL_MOVIE", "30"))
+MOVIE_PEOPLE_CACHE_TTL = float(os.getenv("MS2_CACHE_TTL_MOVIE_PEOPLE", "120"))
+PERSON_CACHE_TTL = float(os.getenv("MS2_CACHE_TTL_PERSON", "120"))
+PERSON_MOVIES_CACHE_TTL = float(os.getenv("MS2_CACHE_TTL_PERSON_MOVIES", "120"))
+
+_MOVIE_PEOPLE_PATH = re.compile(r"^/movies/[^/]+/people$")
+_PERSON_MOVIES_PATH = re.compile(r"^/people/[^/]+/movies$")
+
+
+def _invalidate_resource(path: str, related: "re.Pattern[str]") -> None:
+    """Drop cached reads of ``path``, its sub-resources, and related listings."""
+    client.invalidate(lambda cached: cached == path or cached.startswith(path + "/") or bool(related.match(cached)))
 
 
-def _raise_for_error(resp: httpx.Response) -> None:
-    if resp.status_code >= 400:
-        try:
-            detail = resp.json()
-        except ValueError:
-            detail = resp.text
-        raise HTTPException(status_code=resp.status_code, detail=detail)
+def invalidate_movie(movie_id: int) -> None:
+    existence.forget("movie", movie_id)
+    _invalidate_resource(client.build_path("/movies/{movie_id}", {"movie_id": movie_id}), _PERSON_MOVIES_PATH)
+    materialized.movie_changed(movie_id)
+
+
+def invalidate_person(person_id: int) -> None:
+    _invalidate_resource(client.build_path("/people/{person_id}", {"person_id": person_id}), _MOVIE_PEOPLE_PATH)
 
 
 # Movie endpoints -------------------------------------------------------------
 async def list_movies(params: Dict[str, Any]):
-    return await _request("GET", "/movies", params=params)
+    return await client.request("GET", "/movies", params=params)
+
+
+async def stream_movies(params: Dict[str, Any], accept_encoding: Optional[str] = None):
+    """Open GET /movies as a stream; the caller must close the returned response."""
+    return await client.stream("GET", "/movies", params=params, accept_encoding=accept_encoding)
 
 
 async def create_movie(body: Dict[str, Any]):
-    return await _request("POST", "/movies", json=body)
+    return await client.request("POST", "/movies", json=body)
 
 
 async def get_movie(movie_id: int, headers: Optional[Dict[str, str]] = None):
-    return await _request("GET", f"/movies/{movie_id}", headers=headers)
+    return await client.request(
+        "GET",
+        "/movies/{movie_id}",
+        path_params={"movie_id": movie_id},
+        headers=headers,
+        cache_ttl=MOVIE_CACHE_TTL,
+        revalidate=True,
+        hedge=True,
+    )
 
 
 async def update_movie(movie_id: int, body: Dict[str, Any]):
-    return await _request("PUT", f"/movies/{movie_id}", json=body)
+    try:
+        return await client.request("PUT", "/movies/{movie_id}", path_params={"movie_id": movie_id}, json=body)
+    finally:
+        invalidate_movie(movie_id)
 
 
 async def delete_movie(movie_id: int):
-    return await _request("DELETE", f"/movies/{movie_id}")
+    try:
+        return await client.request("DELETE", "/movies/{movie_id}", path_params={"movie_id": movie_id})
+    finally:
+        invalidate_movie(movie_id)
 
 
 async def get_movie_people(movie_id: int):
-    return await _request("GET", f"/movies/{movie_id}/people")
+    return await client.request(
+        "GET",
+        "/movies/{movie_id}/people",
+        path_params={"movie_id": movie_id},
+        cache_ttl=MOVIE_PEOPLE_CACHE_TTL,
+        hedge=True,
+    )
 
 
 # People endpoints ------------------------------------------------------------
 async def list_people(params: Dict[str, Any]):
-    return await _request("GET", "/people", params=params)
+    return await client.request("GET", "/people", params=params)
+
+
+async def stream_people(params: Dict[str, Any], accept_encoding: Optional[str] = None):
+    """Open GET /people as a stream; the caller must close the returned response."""
+    return await client.stream("GET", "/people", params=params, accept_encoding=accept_encoding)
 
 
 async def create_person(body: Dict[str, Any]):
-    return await _request("POST", "/people", json=body)
+    return await client.request("POST", "/people", json=body)
 
 
 async def get_person(person_id: int):
-    return await _request("GET", f"/people/{person_id}")
+    return await client.request(
+        "GET", "/people/{person_id}", path_params={"person_id": person_id}, cache_ttl=PERSON_CACHE_TTL
+    )
 
 
 async def update_person(person_id: int, body: Dict[str, Any]):
-    return await _request("PUT", f"/people/{person_id}", json=body)
+    try:
+        return await client.request("PUT", "/people/{person_id}", path_params={"person_id": person_id}, json=body)
+    finally:
+        invalidate_person(person_id)
 
 
 async def delete_person(person_id: int):
-    return await _request("DELETE", f"/people/{person_id}")
+    try:
+        return await client.request("DELETE", "/people/{person_id}", path_params={"person_id": person_id})
+    finally:
+        invalidate_person(person_id)
 
 
 async def get_person_movies(person_id: int):
-    return await _request("GET", f"/people/{person_id}/movies")
+    return await client.request(
+        "GET", "/people/{person_id}/movies", path_params={"person_id": person_id}, cache_ttl=PERSON_MOVIES_CACHE_TTL
+    )
 
 
 # Share card async job endpoints ---------------------------------------------
 async def generate_share_card(movie_id: int):
-    return await _request("POST", f"/movies/{movie_id}/generate-share-card")
+    # Background-ish work: queued behind interactive reads and shed first under load
+    with limiter.priority(limiter.LOW):
+        return await client.request(
+            "POST", "/movies/{movie_id}/generate-share-card", path_params={"movie_id": movie_id}
+        )
 
 
 async def get_share_card_job_status(movie_id: int, job_id: str):
-    return await _request("GET", f"/movies/{movie_id}/share-card-jobs/{job_id}")
+    with limiter.priority(limiter.LOW):
+        return await client.request(
+            "GET",
+            "/movies/{movie_id}/share-card-jobs/{job_id}",
+            path_params={"movie_id": movie_id, "job_id": job_id},
+        )
+
+
+# Statuses after which a share-card job no longer changes
+_SHARE_CARD_FINAL_STATUSES = {"done", "complete", "completed", "succeeded", "success", "failed", "error", "cancelled"}
+
+
+def _share_card_job_finished(status: Any) -> bool:
+    if not isinstance(status, dict):
+        return True
+    return bool(status.get("card_url")) or str(status.get("status", "")).lower() in _SHARE_CARD_FINAL_STATUSES
+
+
+async def _fetch_share_card_job(key: Tuple[int, str]):
+    resp = await get_share_card_job_status(*key)
+    return resp.json() if resp.content else None
+
+
+# One MS2 poller per (movie_id, job_id), shared by every long-poll/SSE client
+share_card_jobs = JobWatcher(
+    _fetch_share_card_job,
+    _share_card_job_finished,
+    initial_delay=float(os.getenv("SHARE_CARD_POLL_INITIAL_DELAY", "0.25")),
+    max_delay=float(os.getenv("SHARE_CARD_POLL_MAX_DELAY", "2.0")),
+    max_duration=float(os.getenv("SHARE_CARD_WATCH_MAX_SECONDS", "300")),
+)
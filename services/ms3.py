@@ -3,76 +3,115 @@ from __future__ import annotations
 import os
 from typing import Any, Dict, Optional
 
-import httpx
 from fastapi import HTTPException
 
+from services import materialized
+from services.downstream import DownstreamClient
+from services.pagination import PagePrefetcher
+
 # Base URL for MicroService3 (override via env, e.g., http://localhost:8000)
 # Default to deployed MS3 instance
-MS3_BASE_URL = os.getenv("MS3_BASE_URL", "http://34.61.43.139:8000")
-TIMEOUT = float(os.getenv("MS3_TIMEOUT", "5.0"))
-
-
-async def _request(
-    method: str,
-    path: str,
-    *,
-    params: Optional[Dict[str, Any]] = None,
-    json: Optional[Dict[str, Any]] = None,
-    headers: Optional[Dict[str, str]] = None,
-):
-    """Perform an HTTP request to MicroService3."""
-    async with httpx.AsyncClient(
-        base_url=MS3_BASE_URL,
-        timeout=TIMEOUT,
-        follow_redirects=True,
-    ) as client:
-        resp = await client.request(
-            method,
-            path,
-            params=params,
-            json=json,
-            headers=headers,
-        )
-    _raise_for_error(resp)
-    return resp
+client = DownstreamClient.from_env("ms3", "http://34.61.43.139:8000")
+MS3_BASE_URL = client.base_url
+
+# Pipe list responses straight through instead of decoding and re-encoding them
+STREAM_LISTS = os.getenv("MS3_STREAM_LISTS", "true").lower() in {"1", "true", "yes"}
+
 
+def invalidate_review(review_id: int) -> None:
+    path = client.build_path("/reviews/{review_id}", {"review_id": review_id})
+    client.invalidate(lambda cached: cached == path)
+    review_pages.clear()
 
-def _raise_for_error(resp: httpx.Response) -> None:
-    if resp.status_code >= 400:
-        try:
-            detail = resp.json()
-        except ValueError:
-            detail = resp.text
-        raise HTTPException(status_code=resp.status_code, detail=detail)
+
+def _movie_id_of(resp) -> Optional[Any]:
+    try:
+        data = resp.json()
+    except ValueError:
+        return None
+    return data.get("movie_id") if isinstance(data, dict) else None
+
+
+async def _movie_of_review(review_id: int) -> Optional[Any]:
+    """Movie a review belongs to, so writes can refresh that movie's aggregates."""
+    stored = client.peek("/reviews/{review_id}", path_params={"review_id": review_id})
+    if stored is not None:
+        return _movie_id_of(stored)
+    try:
+        return _movie_id_of(await get_review(review_id))
+    except HTTPException:
+        return None
 
 
 # Review endpoints -------------------------------------------------------------
 async def list_reviews(params: Dict[str, Any]):
     """List reviews with filtering and pagination."""
-    return await _request("GET", "/reviews", params=params)
+    return await client.request("GET", "/reviews", params=params, hedge=True)
+
+
+async def stream_reviews(params: Dict[str, Any], accept_encoding: Optional[str] = None):
+    """Open GET /reviews as a stream; the caller must close the returned response."""
+    return await client.stream("GET", "/reviews", params=params, accept_encoding=accept_encoding)
 
 
 async def create_review(body: Dict[str, Any]):
     """Create a new review."""
-    return await _request("POST", "/reviews", json=body)
+    resp = await client.request("POST", "/reviews", json=body)
+    review_pages.clear()
+    materialized.movie_changed(body.get("movie_id"))
+    return resp
 
 
 async def get_review(review_id: int, headers: Optional[Dict[str, str]] = None):
-    """Get a review by ID. Supports ETag via If-None-Match header."""
-    return await _request("GET", f"/reviews/{review_id}", headers=headers)
+    """
+    Get a review by ID. The last body+ETag is kept and revalidated upstream, so
+    callers compare the client's If-None-Match against the returned ETag.
+    """
+    return await client.request(
+        "GET", "/reviews/{review_id}", path_params={"review_id": review_id}, headers=headers, revalidate=True
+    )
 
 
 async def update_review(review_id: int, body: Dict[str, Any]):
     """Update an existing review."""
-    return await _request("PUT", f"/reviews/{review_id}", json=body)
+    previous_movie_id = await _movie_of_review(review_id)
+    try:
+        resp = await client.request("PUT", "/reviews/{review_id}", path_params={"review_id": review_id}, json=body)
+    finally:
+        invalidate_review(review_id)
+        materialized.movie_changed(previous_movie_id)
+    movie_id = _movie_id_of(resp) or body.get("movie_id")
+    if movie_id is not None and str(movie_id) != str(previous_movie_id):
+        materialized.movie_changed(movie_id)
+    return resp
 
 
 async def delete_review(review_id: int):
     """Delete a review."""
-    return await _request("DELETE", f"/reviews/{review_id}")
+    movie_id = await _movie_of_review(review_id)
+    try:
+        return await client.request("DELETE", "/reviews/{review_id}", path_params={"review_id": review_id})
+    finally:
+        invalidate_review(review_id)
+        materialized.movie_changed(movie_id)
+
+
+async def _fetch_reviews_page(params: Dict[str, Any]):
+    resp = await list_reviews(params)
+    return resp.json() if resp.content else None
+
+
+# Review list pages, with the next page fetched ahead of deep-scrolling clients
+review_pages = PagePrefetcher(
+    "reviews",
+    _fetch_reviews_page,
+    ttl=float(os.getenv("REVIEW_PAGE_PREFETCH_TTL", "15")),
+    max_entries=int(os.getenv("REVIEW_PAGE_PREFETCH_MAX_ENTRIES", "512")),
+    enabled=os.getenv("REVIEW_PAGE_PREFETCH", "true").lower() in {"1", "true", "yes"},
+)
 
 
 # Health check endpoint --------------------------------------------------------
 async def health_check():
     """Health check endpoint."""
-    return await _request("GET", "/health")
+    return await client.request("GET", "/health")
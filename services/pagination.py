@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import HTTPException
+
+from services import limiter
+from services.cache import TTLCache
+from services.singleflight import SingleFlight
+
+# Cursors wrap MS3's page/page_size pagination; the version lets the format change
+_CURSOR_VERSION = 1
+
+
+def encode_cursor(params: Dict[str, Any]) -> str:
+    """Opaque token for a page request (filters plus page/page_size)."""
+    body = json.dumps({"v": _CURSOR_VERSION, "q": {key: str(value) for key, value in params.items()}}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(body.encode("utf-8")).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(token: str) -> Dict[str, str]:
+    try:
+        body = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if body.get("v") != _CURSOR_VERSION or not isinstance(body.get("q"), dict):
+            raise ValueError("unsupported cursor")
+        return {str(key): str(value) for key, value in body["q"].items()}
+    except (ValueError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def next_page_params(params: Dict[str, Any], data: Any) -> Optional[Dict[str, Any]]:
+    """Params of the page after ``data`` (a ``{total, page, page_size, items}`` body), or None at the end."""
+    if not isinstance(data, dict):
+        return None
+    try:
+        page = int(data.get("page") or params.get("page") or 1)
+        size = int(data.get("page_size") or params.get("page_size") or 10)
+    except (TypeError, ValueError):
+        return None
+    items = data.get("items") or []
+    total = data.get("total")
+    has_more = page * size < total if isinstance(total, int) else len(items) >= size
+    if not has_more or not items:
+        return None
+    return {**params, "page": page + 1, "page_size": size}
+
+
+def with_next_cursor(data: Any, params: Dict[str, Any]) -> Any:
+    """Return ``data`` with a ``next_cursor`` for the following page (None on the last page)."""
+    if not isinstance(data, dict):
+        return data
+    following = next_page_params(params, data)
+    return {**data, "next_cursor": encode_cursor(following) if following is not None else None}
+
+
+def _page_key(params: Dict[str, Any]) -> Tuple[Hashable, ...]:
+    return tuple(sorted((key, str(value)) for key, value in params.items()))
+
+
+class PagePrefetcher:
+    """
+    Serve pages of a paginated listing, fetching page N+1 in the background
+    whenever page N is requested.
+
+    Prefetched pages live in a short-TTL cache. Prefetches run at low limiter
+    priority so they never delay interactive calls; for the same reason a
+    request only joins in-flight fetches of its own priority, never a prefetch.
+    """
+
+    def __init__(self, name: str, fetch: Callable[[Dict[str, Any]], Awaitable[Any]], *, ttl: float = 15.0, max_entries: int = 512, enabled: bool = True):
+        self.name = name
+        self.fetch = fetch
+        self.enabled = enabled
+        self._pages = TTLCache(f"{name}-pages", max_entries=max_entries, default_ttl=ttl)
+        self._flights = SingleFlight()
+        self._tasks: set = set()
+        self.prefetched = 0
+
+    async def get(self, params: Dict[str, Any]) -> Any:
+        key = _page_key(params)
+        data = self._pages.get(key)
+        if data is None:
+            data = await self._flights.do((key, limiter.current_priority()), lambda: self.fetch(params))
+        if self.enabled:
+            following = next_page_params(params, data)
+            if following is not None:
+                self._prefetch(following)
+        return data
+
+    def _prefetch(self, params: Dict[str, Any]) -> None:
+        key = _page_key(params)
+        if self._pages.get(key) is not None:
+            return
+        task = asyncio.ensure_future(self._flights.do((key, limiter.LOW), lambda: self._load(key, params)))
+        self._tasks.add(task)
+        task.add_done_callback(self._finish)
+
+    async def _load(self, key: Tuple[Hashable, ...], params: Dict[str, Any]) -> Any:
+        with limiter.priority(limiter.LOW):
+            data = await self.fetch(params)
+        self._pages.set(key, data)
+        self.prefetched += 1
+        return data
+
+    def _finish(self, task: "asyncio.Task[Any]") -> None:
+        self._tasks.discard(task)
+        # A failed prefetch just means the next page is fetched on demand
+        if not task.cancelled():
+            task.exception()
+
+    def clear(self) -> None:
+        self._pages.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._pages.stats(), "prefetched": self.prefetched, "prefetching": len(self._tasks)}
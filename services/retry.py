@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import os
+import random
+import time
+from typing import Any, Dict, FrozenSet, Optional
+
+import httpx
+
+IDEMPOTENT_METHODS: FrozenSet[str] = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRYABLE_STATUSES: FrozenSet[int] = frozenset({502, 503, 504})
+
+# Failures where the request most likely never reached the application
+# (cold start refusing connections, a pooled keep-alive connection closed by the
+# peer). Read timeouts are not retried: the first attempt may still be running.
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+
+
+class RetryBudget:
+    """
+    Token bucket limiting retries to a fraction of overall traffic.
+
+    Every original request deposits ``ratio`` tokens and every retry withdraws
+    one, with ``min_per_second`` tokens always available so low-traffic periods
+    can still retry. During an outage retries therefore stay around ``ratio``
+    of requests instead of multiplying load on the failing service.
+    """
+
+    def __init__(self, *, ratio: float = 0.1, min_per_second: float = 5.0, max_tokens: float = 100.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._refilled_at = time.monotonic()
+        self.exhausted = 0
+
+    def deposit(self) -> None:
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._refilled_at) * self.min_per_second)
+        self._refilled_at = now
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        self.exhausted += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"tokens": round(self._tokens, 2), "exhausted": self.exhausted}
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by attempts and a per-request deadline."""
+
+    def __init__(
+        self,
+        *,
+        max_attempts: int = 3,
+        base_delay: float = 0.05,
+        max_delay: float = 1.0,
+        deadline: float = 5.0,
+        budget: Optional[RetryBudget] = None,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.budget = budget
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry number ``attempt`` (1-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+# Shared by every downstream so retries can't amplify an outage across services
+BUDGET = RetryBudget(
+    ratio=float(os.getenv("RETRY_BUDGET_RATIO", "0.1")),
+    min_per_second=float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", "5")),
+)
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Call:
+    __slots__ = ("future", "waiters")
+
+    def __init__(self, future: "asyncio.Future[Any]") -> None:
+        self.future = future
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into one in-flight execution.
+
+    The first caller for a key starts the call; callers arriving while it is in
+    flight await the same result (or exception). The shared call is shielded,
+    so a cancelled waiter never cancels it for the others; it is cancelled only
+    once every waiter has given up, so abandoned upstream calls do not linger.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is not None:
+            self.coalesced += 1
+        else:
+            call = self._calls[key] = _Call(asyncio.ensure_future(fn()))
+            self.executed += 1
+            call.future.add_done_callback(lambda done: self._finish(key, call))
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.future)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.future.done():
+                # Later callers must not join a call that is being cancelled
+                self._forget(key, call)
+                self.abandoned += 1
+                call.future.cancel()
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def _finish(self, key: Hashable, call: _Call) -> None:
+        self._forget(key, call)
+        # Mark the exception retrieved even if every waiter was cancelled
+        if not call.future.cancelled():
+            call.future.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+            "in_flight": self.in_flight,
+        }
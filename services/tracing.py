@@ -0,0 +1,153 @@
+"""
+Request correlation and per-request timing.
+
+``TracingMiddleware`` accepts (or starts) a W3C trace context and an
+``X-Request-ID`` for each request and keeps them in context variables, so
+``DownstreamClient`` forwards them to MS1/MS2/MS3 with a fresh span id per
+call. With ``SERVER_TIMING_ENABLED`` it also collects timings recorded during
+the request (downstream calls, JSON decode, serialization) and returns them
+in a ``Server-Timing`` header. When disabled, ``span``/``record`` cost one
+context variable lookup.
+"""
+from __future__ import annotations
+
+import os
+import re
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() in {"1", "true", "yes"}
+PROPAGATION_ENABLED = os.getenv("TRACE_PROPAGATION_ENABLED", "true").lower() in {"1", "true", "yes"}
+
+_TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?$")
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+# (name, description, seconds) entries for the current request, or None when disabled
+_timings: ContextVar[Optional[List[Tuple[str, Optional[str], float]]]] = ContextVar("server_timings", default=None)
+_trace: ContextVar[Optional["TraceContext"]] = ContextVar("trace_context", default=None)
+
+
+class TraceContext:
+    __slots__ = ("trace_id", "flags", "tracestate", "request_id")
+
+    def __init__(self, trace_id: str, flags: str, tracestate: Optional[str], request_id: str):
+        self.trace_id = trace_id
+        self.flags = flags
+        self.tracestate = tracestate
+        self.request_id = request_id
+
+    @classmethod
+    def from_headers(cls, traceparent: Optional[str], tracestate: Optional[str], request_id: Optional[str]) -> "TraceContext":
+        """Continue the caller's trace when ``traceparent`` is valid, otherwise start a new one."""
+        trace_id = flags = None
+        match = _TRACEPARENT.match(traceparent.strip().lower()) if traceparent else None
+        if match and match.group(1) != "ff" and set(match.group(2)) != {"0"} and set(match.group(3)) != {"0"}:
+            trace_id, flags = match.group(2), match.group(4)
+        if trace_id is None:
+            trace_id, flags, tracestate = os.urandom(16).hex(), "01", None
+        if not request_id or not _REQUEST_ID.match(request_id):
+            request_id = os.urandom(16).hex()
+        return cls(trace_id, flags, tracestate, request_id)
+
+    def outgoing_headers(self) -> Dict[str, str]:
+        headers = {
+            "traceparent": f"00-{self.trace_id}-{os.urandom(8).hex()}-{self.flags}",
+            "x-request-id": self.request_id,
+        }
+        if self.tracestate:
+            headers["tracestate"] = self.tracestate
+        return headers
+
+
+def outgoing_headers() -> Dict[str, str]:
+    """Headers correlating a downstream call with the current request ({} outside a request)."""
+    context = _trace.get()
+    if context is None or not PROPAGATION_ENABLED:
+        return {}
+    return context.outgoing_headers()
+
+
+def record(name: str, desc: Optional[str], seconds: float) -> None:
+    """Add a timing entry to the current request's Server-Timing header, if enabled."""
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, desc, seconds))
+
+
+class _Span:
+    __slots__ = ("name", "desc", "start", "timings")
+
+    def __init__(self, name: str, desc: Optional[str]):
+        self.name = name
+        self.desc = desc
+
+    def __enter__(self) -> "_Span":
+        self.timings = _timings.get()
+        if self.timings is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.timings is not None:
+            self.timings.append((self.name, self.desc, time.perf_counter() - self.start))
+
+
+def span(name: str, desc: Optional[str] = None) -> _Span:
+    """Context manager timing a block as one Server-Timing entry."""
+    return _Span(name, desc)
+
+
+def server_timing(timings: List[Tuple[str, Optional[str], float]], total: float) -> str:
+    """Format timings as a Server-Timing header; repeated (name, desc) pairs are summed."""
+    merged: Dict[Tuple[str, Optional[str]], float] = {}
+    for name, desc, seconds in timings:
+        merged[(name, desc)] = merged.get((name, desc), 0.0) + seconds
+    parts = []
+    for (name, desc), seconds in merged.items():
+        desc_part = ';desc="' + desc.replace("\\", "\\\\").replace('"', '\\"') + '"' if desc else ""
+        parts.append(f"{name}{desc_part};dur={seconds * 1000:.1f}")
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class TracingMiddleware:
+    """ASGI middleware binding the trace context and Server-Timing collector to each request."""
+
+    def __init__(self, app, *, server_timing_enabled: bool = SERVER_TIMING_ENABLED):
+        self.app = app
+        self.server_timing_enabled = server_timing_enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        traceparent = tracestate = request_id = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+            elif name == b"tracestate":
+                tracestate = value.decode("latin-1")
+            elif name == b"x-request-id":
+                request_id = value.decode("latin-1")
+        context = TraceContext.from_headers(traceparent, tracestate, request_id)
+        timings: Optional[List[Tuple[str, Optional[str], float]]] = [] if self.server_timing_enabled else None
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", context.request_id.encode("latin-1")))
+                if timings is not None:
+                    header = server_timing(timings, time.perf_counter() - start)
+                    headers.append((b"server-timing", header.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        trace_token = _trace.set(context)
+        timings_token = _timings.set(timings)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(timings_token)
+            _trace.reset(trace_token)
@@ -0,0 +1,109 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from services import auth
+
+SECRET = "test-secret"
+
+
+@pytest.fixture(autouse=True)
+def hs256(monkeypatch):
+    monkeypatch.setattr(auth, "JWT_SECRET", SECRET)
+    monkeypatch.setattr(auth, "ALGORITHM", "HS256")
+    monkeypatch.setattr(auth, "ENABLED", True)
+    monkeypatch.setattr(auth, "LEEWAY", 0.0)
+    monkeypatch.setattr(auth, "ISSUER", "")
+    monkeypatch.setattr(auth, "AUDIENCE", "")
+    monkeypatch.setattr(auth, "PROFILE_CACHE_TTL", 30.0)
+    for cache in (auth._tokens, auth._revoked, auth._profiles):
+        cache.clear()
+    yield
+    for cache in (auth._tokens, auth._revoked, auth._profiles):
+        cache.clear()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(auth.time, "time", lambda: now[0])
+    return now
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _token(claims, alg="HS256", secret=SECRET):
+    header = _b64(json.dumps({"alg": alg, "typ": "JWT"}).encode())
+    payload = _b64(json.dumps(claims).encode())
+    signing_input = f"{header}.{payload}".encode("ascii")
+    if alg == "none":
+        signature = ""
+    else:
+        signature = _b64(hmac.new(secret.encode(), signing_input, hashlib.sha256).digest())
+    return f"Bearer {header}.{payload}.{signature}"
+
+
+def _authenticate(authorization):
+    return asyncio.run(auth.authenticate(authorization))
+
+
+def _rejection(authorization):
+    with pytest.raises(HTTPException) as exc:
+        _authenticate(authorization)
+    assert exc.value.status_code == 401
+    return exc.value.detail["message"]
+
+
+def test_valid_token_returns_claims(clock):
+    claims = {"sub": "42", "exp": clock[0] + 300}
+    assert _authenticate(_token(claims)) == claims
+    # Served from the token cache the second time
+    assert _authenticate(_token(claims)) == claims
+    assert auth.stats()["token_cache"]["entries"] == 1
+
+
+def test_bad_signature_is_rejected(clock):
+    assert _rejection(_token({"sub": "42"}, secret="other-secret")) == "Invalid token signature"
+
+
+def test_alg_none_is_rejected(clock):
+    assert _rejection(_token({"sub": "42"}, alg="none")) == "Unsupported token algorithm"
+
+
+def test_expired_token_is_rejected(clock):
+    assert _rejection(_token({"sub": "42", "exp": clock[0] - 1})) == "Token expired"
+
+
+def test_not_yet_valid_token_is_not_cached(clock):
+    token = _token({"sub": "42", "nbf": clock[0] + 10, "exp": clock[0] + 300})
+    assert _rejection(token) == "Token not yet valid"
+    clock[0] += 11
+    assert _authenticate(token)["sub"] == "42"
+
+
+def test_logout_revokes_token(clock):
+    token = _token({"sub": "42", "exp": clock[0] + 300})
+    claims = _authenticate(token)
+    auth.revoke(token, claims)
+    assert _rejection(token) == "Token revoked"
+
+
+def test_forget_profile_drops_every_subjects_copy():
+    alice, bob = {"sub": "1"}, {"sub": "2"}
+    auth.remember_profile(alice, 7, {"id": 7})
+    auth.remember_profile(bob, 7, {"id": 7})
+    auth.remember_profile(alice, 8, {"id": 8})
+    assert auth.cached_profile(bob, 7) == {"id": 7}
+
+    auth.forget_profile("7")
+
+    assert auth.cached_profile(alice, 7) is None
+    assert auth.cached_profile(bob, 7) is None
+    assert auth.cached_profile(alice, 8) == {"id": 8}
@@ -0,0 +1,79 @@
+import pytest
+
+from services import breaker as breaker_module
+from services.breaker import CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(breaker_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _call(breaker, success, elapsed=0.01):
+    breaker.acquire()
+    breaker.release(success, elapsed)
+
+
+def _tripped(**kwargs):
+    breaker = CircuitBreaker("t", window=4, min_calls=4, open_seconds=10, half_open_calls=2, **kwargs)
+    for success in (True, False, True, False):
+        _call(breaker, success)
+    return breaker
+
+
+def test_opens_at_failure_rate_and_fails_fast(clock):
+    breaker = _tripped()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError) as exc:
+        breaker.acquire()
+    assert exc.value.retry_after == pytest.approx(10)
+    assert breaker.rejected == 1
+
+
+def test_stays_closed_below_min_calls(clock):
+    breaker = CircuitBreaker("t", window=4, min_calls=4)
+    for _ in range(3):
+        _call(breaker, False)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_opens_on_slow_calls(clock):
+    breaker = CircuitBreaker("t", window=4, min_calls=4, slow_call_seconds=1.0, slow_call_rate=0.5)
+    for elapsed in (0.1, 2.0, 0.1, 2.0):
+        _call(breaker, True, elapsed)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_probes_close_the_circuit(clock):
+    breaker = _tripped()
+    clock[0] += 10
+    breaker.acquire()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.acquire()
+    # Only half_open_calls probes at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+    breaker.release(True, 0.01)
+    breaker.release(True, 0.01)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()["calls_in_window"] == 0
+
+
+def test_failed_probe_reopens(clock):
+    breaker = _tripped()
+    clock[0] += 10
+    _call(breaker, False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened == 2
+
+
+def test_cancelled_probe_frees_its_slot(clock):
+    breaker = _tripped()
+    clock[0] += 10
+    breaker.acquire()
+    breaker.acquire()
+    breaker.release(None, 0.0)
+    breaker.acquire()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
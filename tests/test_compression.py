@@ -0,0 +1,81 @@
+import asyncio
+import gzip
+
+import compression
+from compression import CompressionMiddleware
+
+BODY = b'{"items": [' + b",".join(b'{"id": %d}' % i for i in range(200)) + b"]}"
+
+
+def _app(messages):
+    async def app(scope, receive, send):
+        for message in messages:
+            await send(message)
+
+    return app
+
+
+def _start(length=None, **headers):
+    raw = [(b"content-type", b"application/json")]
+    if length is not None:
+        raw.append((b"content-length", str(length).encode()))
+    raw.extend((name.replace("_", "-").encode(), value.encode()) for name, value in headers.items())
+    return {"type": "http.response.start", "status": 200, "headers": raw}
+
+
+def _run(messages, accept="gzip", minimum_size=100):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept.encode())]}
+    middleware = CompressionMiddleware(_app(messages), minimum_size=minimum_size)
+    asyncio.run(middleware(scope, receive, send))
+    return sent
+
+
+def _headers(message):
+    return {name.decode(): value.decode() for name, value in message["headers"]}
+
+
+def test_complete_body_is_gzipped():
+    sent = _run([_start(len(BODY)), {"type": "http.response.body", "body": BODY}])
+    headers = _headers(sent[0])
+    assert headers["content-encoding"] == "gzip"
+    assert headers["vary"] == "Accept-Encoding"
+    assert gzip.decompress(sent[1]["body"]) == BODY
+    assert int(headers["content-length"]) == len(sent[1]["body"])
+
+
+def test_streamed_body_with_content_length_passes_through():
+    half = len(BODY) // 2
+    messages = [
+        _start(len(BODY)),
+        {"type": "http.response.body", "body": BODY[:half], "more_body": True},
+        {"type": "http.response.body", "body": BODY[half:], "more_body": True},
+        {"type": "http.response.body", "body": b"", "more_body": False},
+    ]
+    sent = _run(messages)
+    assert sent == messages
+
+
+def test_small_or_unaccepted_bodies_are_untouched():
+    messages = [_start(len(BODY)), {"type": "http.response.body", "body": BODY}]
+    assert _run(messages, minimum_size=len(BODY) + 1)[1]["body"] == BODY
+    assert _run(messages, accept="identity") == messages
+
+
+def test_already_encoded_body_is_untouched():
+    messages = [_start(len(BODY), content_encoding="gzip"), {"type": "http.response.body", "body": BODY}]
+    assert _run(messages) == messages
+
+
+def test_choose_encoding():
+    assert compression.choose_encoding("gzip;q=0, identity") is None
+    assert compression.choose_encoding("*") == "gzip"
+    expected = "br" if compression.brotli is not None else "gzip"
+    assert compression.choose_encoding("gzip, br") == expected
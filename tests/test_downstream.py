@@ -0,0 +1,131 @@
+import asyncio
+import itertools
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from services.cache import TTLCache
+from services.downstream import DownstreamClient
+from services.latency import LatencyTracker
+from services.retry import RetryBudget, RetryPolicy
+
+_names = itertools.count()
+
+
+def _client(handler, **kwargs):
+    client = DownstreamClient(f"test-{next(_names)}", "http://upstream", **kwargs)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://upstream")
+    return client
+
+
+def _policy(**kwargs):
+    return RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.001, deadline=5.0, **kwargs)
+
+
+def _flaky(statuses):
+    """Handler answering with ``statuses`` in turn, recording the methods it saw."""
+    calls = []
+    statuses = iter(statuses)
+
+    def handler(request):
+        calls.append(request.method)
+        return httpx.Response(next(statuses), json={"ok": True})
+
+    return handler, calls
+
+
+def test_post_is_not_retried():
+    handler, calls = _flaky([503, 201])
+    client = _client(handler, retry_policy=_policy())
+
+    async def scenario():
+        with pytest.raises(HTTPException) as exc:
+            await client.request("POST", "/reviews", json={})
+        return exc.value.status_code
+
+    assert asyncio.run(scenario()) == 503
+    assert calls == ["POST"]
+
+
+def test_get_is_retried_on_503_until_it_succeeds():
+    handler, calls = _flaky([503, 503, 200])
+    client = _client(handler, retry_policy=_policy())
+
+    resp = asyncio.run(client.request("GET", "/movies"))
+
+    assert resp.status_code == 200
+    assert calls == ["GET", "GET", "GET"]
+    assert client._retries[("GET", "/movies")] == 2
+
+
+def test_empty_budget_stops_retries():
+    handler, calls = _flaky([503, 200])
+    budget = RetryBudget(ratio=0.0, min_per_second=0.0, max_tokens=0.0)
+    client = _client(handler, retry_policy=_policy(budget=budget))
+
+    async def scenario():
+        with pytest.raises(HTTPException) as exc:
+            await client.request("GET", "/movies")
+        return exc.value.status_code
+
+    assert asyncio.run(scenario()) == 503
+    assert calls == ["GET"]
+    assert budget.exhausted == 1
+
+
+def test_304_revalidation_returns_stored_body():
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"ETag": '"v1"'})
+        return httpx.Response(200, json={"id": 1}, headers={"ETag": '"v1"'})
+
+    client = _client(handler, etags=TTLCache("test_etags"))
+
+    async def scenario():
+        first = await client.request("GET", "/movies/{movie_id}", path_params={"movie_id": 1}, revalidate=True)
+        second = await client.request("GET", "/movies/{movie_id}", path_params={"movie_id": 1}, revalidate=True)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert seen == [None, '"v1"']
+    assert second.status_code == 200
+    assert second.json() == {"id": 1}
+    assert second is first
+    assert client.revalidated == 1
+
+
+def test_hedge_loser_is_cancelled():
+    calls = itertools.count()
+    cancelled = []
+
+    async def handler(request):
+        if next(calls) == 0:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+        return httpx.Response(200, json={"ok": True})
+
+    client = _client(handler, hedge_percentile=95, hedge_min_samples=10)
+    tracker = client._latency[("GET", "/movies")] = LatencyTracker()
+    for _ in range(10):
+        tracker.record(0.01)
+
+    async def scenario():
+        resp = await client.request("GET", "/movies", hedge=True)
+        # Let the cancellation reach the slow handler before the loop shuts down
+        await asyncio.sleep(0.01)
+        return resp, list(cancelled)
+
+    resp, cancelled_in_flight = asyncio.run(scenario())
+
+    assert resp.status_code == 200
+    assert client.hedges == 1
+    assert client.hedge_wins == 1
+    assert cancelled_in_flight == [True]
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from services.jobwatch import JobWatcher
+
+
+def _watcher(statuses, **kwargs):
+    """JobWatcher over a scripted sequence of fetch results (HTTPExceptions are raised)."""
+    script = list(statuses)
+    fetched = []
+
+    async def fetch(key):
+        fetched.append(key)
+        result = script.pop(0) if len(script) > 1 else script[0]
+        if isinstance(result, HTTPException):
+            raise result
+        return result
+
+    options = {"initial_delay": 0.001, "max_delay": 0.001, "linger": 0.05}
+    options.update(kwargs)
+    return JobWatcher(fetch, lambda status: status.get("state") == "done", **options), fetched
+
+
+async def _collect(watcher, key):
+    return [status async for status in watcher.watch(key)]
+
+
+def test_watch_yields_changes_until_final():
+    async def scenario():
+        watcher, _ = _watcher([{"state": "queued"}, {"state": "queued"}, {"state": "running"}, {"state": "done"}])
+        assert await _collect(watcher, "job") == [{"state": "queued"}, {"state": "running"}, {"state": "done"}]
+
+    asyncio.run(scenario())
+
+
+def test_subscribers_share_one_poller_and_late_ones_get_the_final_status():
+    async def scenario():
+        watcher, fetched = _watcher([{"state": "running"}, {"state": "running"}, {"state": "done"}])
+        first, second = await asyncio.gather(_collect(watcher, "job"), _collect(watcher, "job"))
+        assert first == second == [{"state": "running"}, {"state": "done"}]
+        polls = len(fetched)
+        assert polls == 3
+        # Within the linger period the final status is served without polling
+        assert await _collect(watcher, "job") == [{"state": "done"}]
+        assert len(fetched) == polls
+        await asyncio.sleep(0.1)
+        assert watcher.stats()["jobs_finished"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_client_error_ends_the_watch():
+    async def scenario():
+        watcher, fetched = _watcher([HTTPException(status_code=404, detail="gone")])
+        with pytest.raises(HTTPException) as exc:
+            await _collect(watcher, "job")
+        assert exc.value.status_code == 404
+        assert len(fetched) == 1
+
+    asyncio.run(scenario())
+
+
+def test_server_errors_are_retried_up_to_max_errors():
+    async def scenario():
+        error = HTTPException(status_code=503, detail="down")
+        watcher, fetched = _watcher([error, error, {"state": "done"}], max_errors=3)
+        assert await _collect(watcher, "job") == [{"state": "done"}]
+
+        watcher, fetched = _watcher([error], max_errors=2)
+        with pytest.raises(HTTPException) as exc:
+            await _collect(watcher, "job")
+        assert exc.value.status_code == 503
+        assert len(fetched) == 2
+
+    asyncio.run(scenario())
+
+
+def test_wait_returns_latest_status_on_timeout():
+    async def scenario():
+        watcher, _ = _watcher([{"state": "running"}])
+        assert await watcher.wait("job", timeout=0.05) == {"state": "running"}
+        await asyncio.sleep(0.01)
+        # The last subscriber left, so polling stopped
+        assert watcher.stats()["jobs_polling"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_gives_up_after_max_duration():
+    async def scenario():
+        watcher, _ = _watcher([{"state": "running"}], max_duration=0.01, initial_delay=0.005, max_delay=0.005)
+        with pytest.raises(HTTPException) as exc:
+            await _collect(watcher, "job")
+        assert exc.value.status_code == 504
+
+    asyncio.run(scenario())
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from services import limiter
+from services.limiter import AdaptiveLimiter, LimiterQueueFull
+
+
+def test_limit_grows_additively_on_fast_successes():
+    lim = AdaptiveLimiter("t", initial_limit=10, max_limit=100)
+    for _ in range(10):
+        lim.in_flight += 1
+        lim.release(True, 0.01)
+    # +1/limit per call: about +1 per window of `limit` calls
+    assert 10.9 < lim.limit < 11.0
+    assert lim.increases == 10
+
+
+def test_limit_shrinks_once_per_round_trip_on_failure():
+    lim = AdaptiveLimiter("t", initial_limit=20, min_limit=5, backoff=0.5)
+    lim.release(False, 10.0)
+    assert lim.limit == 10
+    # Another failure within the same round-trip does not shrink again
+    lim.release(False, 10.0)
+    assert lim.limit == 10
+    assert lim.decreases == 1
+
+
+def test_limit_shrinks_on_slow_calls_and_respects_min():
+    lim = AdaptiveLimiter("t", initial_limit=6, min_limit=5, backoff=0.5, tolerance=2.0, min_samples=5)
+    for _ in range(5):
+        lim.release(True, 0.01)
+    lim.release(True, 0.5)
+    assert lim.limit == 5
+    assert lim.decreases == 1
+
+
+def test_waiter_is_granted_on_release():
+    async def scenario():
+        lim = AdaptiveLimiter("t", initial_limit=1, min_limit=1)
+        assert await lim.acquire() == 0.0
+        waiter = asyncio.ensure_future(lim.acquire())
+        await asyncio.sleep(0)
+        assert lim.stats()["queued"] == 1
+        lim.release(True, 0.01)
+        assert await waiter >= 0.0
+        assert lim.in_flight == 1
+        assert lim.stats()["queued"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_evicts_lower_priority_waiter():
+    async def scenario():
+        lim = AdaptiveLimiter("t", initial_limit=1, min_limit=1, max_queue=1)
+        await lim.acquire()
+        low = asyncio.ensure_future(lim.acquire(limiter.LOW))
+        await asyncio.sleep(0)
+        high = asyncio.ensure_future(lim.acquire(limiter.HIGH))
+        await asyncio.sleep(0)
+        with pytest.raises(LimiterQueueFull):
+            await low
+        # Nothing lower than HIGH is left to evict
+        with pytest.raises(LimiterQueueFull):
+            await lim.acquire(limiter.NORMAL)
+        lim.release(True, 0.01)
+        await high
+        assert lim.shed == {"high": 0, "normal": 1, "low": 1}
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_rejects_and_frees_the_queue():
+    async def scenario():
+        lim = AdaptiveLimiter("t", initial_limit=1, min_limit=1, queue_timeout=0.01)
+        await lim.acquire()
+        with pytest.raises(LimiterQueueFull):
+            await lim.acquire()
+        assert lim.stats()["queued"] == 0
+        lim.release(True, 0.01)
+        assert lim.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        lim = AdaptiveLimiter("t", initial_limit=1, min_limit=1)
+        await lim.acquire()
+        waiter = asyncio.ensure_future(lim.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert lim.stats()["queued"] == 0
+        lim.release(True, 0.01)
+        assert lim.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_priority_context_is_restored():
+    assert limiter.current_priority() == limiter.NORMAL
+    with limiter.priority(limiter.LOW):
+        assert limiter.current_priority() == limiter.LOW
+    assert limiter.current_priority() == limiter.NORMAL
@@ -0,0 +1,100 @@
+import asyncio
+
+from fastapi import HTTPException
+
+from services.materialized import MaterializedStore
+
+
+def _store(results, **kwargs):
+    """Store whose builds return (or raise) the scripted results, each after ``gate`` is set."""
+    script = list(results)
+    gate = asyncio.Event()
+    gate.set()
+
+    async def build(key):
+        await gate.wait()
+        result = script.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    store = MaterializedStore("t", build, **kwargs)
+    store.track([1])
+    return store, gate
+
+
+def test_changed_document_is_not_served_until_rebuilt():
+    async def scenario():
+        store, gate = _store([{"v": 1}, {"v": 2}])
+        await store.warm()
+        assert store.get(1)["payload"] == {"v": 1}
+
+        gate.clear()
+        store.changed(1)
+        assert store.get(1) is None
+        assert store.previous(1) is None
+        gate.set()
+        await asyncio.sleep(0.01)
+        assert store.get(1)["payload"] == {"v": 2}
+
+    asyncio.run(scenario())
+
+
+def test_write_during_rebuild_keeps_the_key_stale():
+    async def scenario():
+        store, gate = _store([{"v": 1}, {"v": 2}, {"v": 3}])
+        await store.warm()
+        gate.clear()
+        store.changed(1)
+        await asyncio.sleep(0)
+        store.changed(1)  # arrives while the first rebuild is running
+        gate.set()
+        for _ in range(5):
+            await asyncio.sleep(0)
+            document = store.get(1)
+            assert document is None or document["payload"] == {"v": 3}
+        await asyncio.sleep(0.01)
+        assert store.get(1)["payload"] == {"v": 3}
+        assert store.refreshes == 3
+
+    asyncio.run(scenario())
+
+
+def test_failed_rebuild_after_a_write_keeps_the_key_unavailable():
+    async def scenario():
+        store, _ = _store([{"v": 1}, HTTPException(status_code=503), HTTPException(status_code=404)])
+        await store.warm()
+        store.changed(1)
+        await asyncio.sleep(0.01)
+        assert store.get(1) is None
+        assert store.failures == 1
+        store.changed(1)
+        await asyncio.sleep(0.01)
+        # The entity is gone: the document is dropped
+        assert store.stats()["materialized"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_expired_document_is_rebuilt():
+    async def scenario():
+        store, _ = _store([{"v": 1}, {"v": 2}], max_age=0.01)
+        await store.warm()
+        await asyncio.sleep(0.02)
+        assert store.get(1) is None
+        assert store.previous(1)["payload"] == {"v": 1}
+        await asyncio.sleep(0.005)
+        assert store.get(1)["payload"] == {"v": 2}
+        assert store.expired == 1
+
+    asyncio.run(scenario())
+
+
+def test_untracked_keys_are_ignored():
+    async def scenario():
+        store, _ = _store([])
+        store.changed(2)
+        assert store.get(2) is None
+        assert store.stats()["refreshing"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from services import limiter, pagination
+from services.pagination import PagePrefetcher
+
+
+def test_cursor_round_trip():
+    params = {"movie_id": 3, "page": 2, "page_size": 10}
+    token = pagination.encode_cursor(params)
+    assert "=" not in token
+    assert pagination.decode_cursor(token) == {"movie_id": "3", "page": "2", "page_size": "10"}
+
+
+@pytest.mark.parametrize("token", ["", "!!!", "bm90IGpzb24", pagination.encode_cursor({})[:-2] + "xx"])
+def test_invalid_cursor_is_a_400(token):
+    with pytest.raises(HTTPException) as exc:
+        pagination.decode_cursor(token)
+    assert exc.value.status_code == 400
+
+
+def test_next_page_params():
+    page = {"total": 25, "page": 2, "page_size": 10, "items": [{}] * 10}
+    assert pagination.next_page_params({"movie_id": 1}, page) == {"movie_id": 1, "page": 3, "page_size": 10}
+    last = {"total": 25, "page": 3, "page_size": 10, "items": [{}] * 5}
+    assert pagination.next_page_params({}, last) is None
+    # Without a total, a full page means there may be more
+    assert pagination.next_page_params({"page": 1, "page_size": 2}, {"items": [{}, {}]})["page"] == 2
+    assert pagination.next_page_params({"page": 1, "page_size": 2}, {"items": [{}]}) is None
+    assert pagination.next_page_params({}, None) is None
+
+
+def test_with_next_cursor():
+    data = {"total": 3, "page": 1, "page_size": 2, "items": [{}, {}]}
+    following = pagination.with_next_cursor(data, {"movie_id": 1})
+    assert pagination.decode_cursor(following["next_cursor"]) == {"movie_id": "1", "page": "2", "page_size": "2"}
+    assert pagination.with_next_cursor({**data, "page": 2}, {})["next_cursor"] is None
+    assert pagination.with_next_cursor([1, 2], {}) == [1, 2]
+
+
+def test_prefetcher_serves_the_next_page_from_cache():
+    async def scenario():
+        fetched = []
+
+        async def fetch(params):
+            fetched.append((dict(params), limiter.current_priority()))
+            page = int(params["page"])
+            return {"total": 30, "page": page, "page_size": 10, "items": [page] * 10}
+
+        pages = PagePrefetcher("t", fetch)
+        first = await pages.get({"page": 1, "page_size": 10})
+        assert first["items"][0] == 1
+        await asyncio.sleep(0.01)
+        # Page 2 was prefetched in the background, at low priority
+        assert fetched[1] == ({"page": 2, "page_size": 10}, limiter.LOW)
+        second = await pages.get({"page": 2, "page_size": 10})
+        assert second["items"][0] == 2
+        await asyncio.sleep(0.01)
+        assert len(fetched) == 3  # page 2 from cache, page 3 prefetched
+        # No page 4 exists, so nothing more is prefetched
+        await pages.get({"page": 3, "page_size": 10})
+        await asyncio.sleep(0.01)
+        assert len(fetched) == 3
+        pages.clear()
+        assert pages.stats()["entries"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_disabled_prefetcher_only_fetches_requested_pages():
+    async def scenario():
+        fetched = []
+
+        async def fetch(params):
+            fetched.append(params)
+            return {"total": 30, "page": 1, "page_size": 10, "items": [0] * 10}
+
+        pages = PagePrefetcher("t", fetch, enabled=False)
+        await pages.get({"page": 1, "page_size": 10})
+        await asyncio.sleep(0.01)
+        assert len(fetched) == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,37 @@
+import projection
+
+
+def test_parse_fields_builds_a_nested_tree():
+    assert projection.parse_fields("movie.title, reviews.items.rating,movie.year") == {
+        "movie": {"title": {}, "year": {}},
+        "reviews": {"items": {"rating": {}}},
+    }
+
+
+def test_parse_fields_whole_ancestor_wins():
+    assert projection.parse_fields("movie,movie.title") == {"movie": {}}
+    assert projection.parse_fields("movie.title,movie") == {"movie": {}}
+
+
+def test_parse_fields_empty_means_everything():
+    assert projection.parse_fields(None) is None
+    assert projection.parse_fields("") is None
+    assert projection.parse_fields(" , .") is None
+
+
+def test_project_lists_element_wise_and_skips_missing_keys():
+    data = {
+        "movie": {"id": 1, "title": "A", "year": 2000},
+        "reviews": {"total": 2, "items": [{"rating": 4, "text": "x"}, {"rating": 5, "text": "y"}]},
+    }
+    assert projection.apply(data, "movie.title,reviews.items.rating,missing") == {
+        "movie": {"title": "A"},
+        "reviews": {"items": [{"rating": 4}, {"rating": 5}]},
+    }
+
+
+def test_project_keeps_whole_objects_and_scalars():
+    data = {"movie": {"id": 1, "cast": [{"name": "n"}]}, "n": 3}
+    assert projection.apply(data, "movie") == {"movie": data["movie"]}
+    assert projection.project(7, {"a": {}}) == 7
+    assert projection.apply(data, None) is data
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from services.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flights = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "value"
+
+        results = await asyncio.gather(*(flights.do("k", fetch) for _ in range(5)))
+        assert results == ["value"] * 5
+        assert calls == 1
+        assert flights.stats() == {"executed": 1, "coalesced": 4, "abandoned": 0, "in_flight": 0}
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_every_waiter():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(*(flights.do("k", fetch) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+    asyncio.run(scenario())
+
+
+def test_cancelling_one_waiter_keeps_the_shared_call():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return "value"
+
+        first = asyncio.ensure_future(flights.do("k", fetch))
+        second = asyncio.ensure_future(flights.do("k", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "value"
+        assert flights.stats()["abandoned"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_shared_call_is_cancelled_when_every_waiter_leaves():
+    async def scenario():
+        flights = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiters = [asyncio.ensure_future(flights.do("k", slow)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        assert flights.in_flight == 0
+        assert flights.abandoned == 1
+
+        async def fast():
+            return "fresh"
+
+        # A later caller starts a new call instead of joining the cancelled one
+        assert await flights.do("k", fast) == "fresh"
+
+    asyncio.run(scenario())
+
+
+def test_waiter_cancelled_with_timeout_propagates():
+    async def scenario():
+        flights = SingleFlight()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(flights.do("k", lambda: asyncio.sleep(10)), timeout=0.01)
+        await asyncio.sleep(0)
+        assert flights.in_flight == 0
+
+    asyncio.run(scenario())